@@ -5,6 +5,7 @@ AI provider interface and OpenAI implementation for quiz generation.
 import json
 import time
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 from openai import OpenAI
 from app.config import config
@@ -213,8 +214,9 @@ Return ONLY the JSON array, no other text.
         return True
 
 
+@lru_cache(maxsize=1)
 def get_ai_provider() -> AIProvider:
-    """Get configured AI provider instance."""
+    """Get the configured AI provider, built once so its HTTP pool is reused."""
     if not config.OPENAI_API_KEY or config.OPENAI_API_KEY == "REPLACE_OPENAI_KEY":
         raise ValueError("OPENAI_API_KEY not configured")
     
@@ -2,14 +2,24 @@
 Telegram bot logic using pyTelegramBotAPI for CourseMateBot.
 """
 
-import json
+import traceback
+import requests
 import telebot
+from requests.adapters import HTTPAdapter
 from telebot import types
 from app.config import config
-from app.database import SessionLocal
+from app.database import SessionLocal, with_session
 from app import crud, models
 from app.tasks import submit_quiz_generation_task, get_job_status
 from app.storage import get_file_path
+from app.jsonutil import loads_json
+
+# Share one keep-alive HTTPS pool across every thread that calls Telegram,
+# sized for the bot handlers plus the background task workers in app.tasks
+telegram_session = requests.Session()
+telegram_session.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+telebot.apihelper.session = telegram_session
+telebot.apihelper.SESSION_TIME_TO_LIVE = None
 
 # Initialize bot
 bot = telebot.TeleBot(config.TELEGRAM_TOKEN)
@@ -18,6 +28,22 @@ bot = telebot.TeleBot(config.TELEGRAM_TOKEN)
 user_sessions = {}
 
 
+def open_telegram_file(file_path: str) -> requests.Response:
+    """Open a streaming download of a file stored on Telegram's servers."""
+    apihelper = telebot.apihelper
+    url_template = apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}"
+    # Same proxy and timeouts as telebot's own download_file
+    response = telegram_session.get(
+        url_template.format(config.TELEGRAM_TOKEN, file_path),
+        stream=True,
+        proxies=apihelper.proxy,
+        timeout=(apihelper.CONNECT_TIMEOUT, apihelper.READ_TIMEOUT),
+    )
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return response
+
+
 def get_session(user_id: int) -> dict:
     """Get or create user session."""
     if user_id not in user_sessions:
@@ -457,7 +483,7 @@ def handle_approve_student(call):
     
     try:
         student = crud.get_student_by_university_id(db, None)
-        student = db.query(crud.models.Student).filter(crud.models.Student.id == student_id).first()
+        student = db.get(crud.models.Student, student_id)
         
         if not student:
             bot.answer_callback_query(call.id, "Student not found")
@@ -792,7 +818,7 @@ def handle_quiz_start(call):
             models.BackgroundJob.job_type == 'quiz_generation',
             models.BackgroundJob.course_id == course_id,
             models.BackgroundJob.student_id == student.id
-        ).order_by(models.BackgroundJob.created_at.desc()).limit(1).all()
+        ).order_by(models.BackgroundJob.created_at.desc(), models.BackgroundJob.id.desc()).limit(1).all()
         
         if recent_jobs:
             job = recent_jobs[0]
@@ -821,7 +847,7 @@ def handle_quiz_start(call):
                 if quiz_id:
                     quiz = crud.get_quiz_by_id(db, quiz_id)
                     if quiz:
-                        questions = json.loads(quiz.data_json)
+                        questions = loads_json(quiz.data_json)
                         
                         session = get_session(call.from_user.id)
                         session["data"]["quiz_id"] = quiz.id
@@ -1217,10 +1243,6 @@ def handle_prof_upload_file(message):
             )
             return
         
-        # Get file
-        file_info = bot.get_file(message.document.file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        
         # Get upload data
         course_id = session["data"].get("prof_course_id")
         if not course_id:
@@ -1236,8 +1258,8 @@ def handle_prof_upload_file(message):
         filename = message.document.file_name
         description = message.caption or ""
         
-        # Save file
-        from app.storage import get_storage_path, save_uploaded_file
+        # Stream file straight from Telegram to disk
+        from app.storage import get_storage_path, save_uploaded_stream
         full_path, relative_path = get_storage_path(
             course.university.name,
             course.major.name,
@@ -1246,7 +1268,11 @@ def handle_prof_upload_file(message):
             filename
         )
         
-        if not save_uploaded_file(downloaded_file, full_path):
+        file_info = bot.get_file(message.document.file_id)
+        with open_telegram_file(file_info.file_path) as response:
+            saved = save_uploaded_stream(response.raw, full_path)
+        
+        if not saved:
             bot.send_message(message.chat.id, "❌ Failed to save file")
             return
         
@@ -1286,7 +1312,6 @@ def handle_prof_upload_file(message):
     
     except Exception as e:
         print(f"Upload error: {e}")
-        import traceback
         traceback.print_exc()
         bot.send_message(message.chat.id, f"❌ Upload failed: {str(e)}")
     
@@ -2652,27 +2677,14 @@ def handle_confirm_delete_course(call):
     handle_admin_courses(call)
 
 
-@bot.callback_query_handler(func=lambda call: call.data == 'admin_professors')
-def handle_admin_professors(call):
-    """Show all professors with management options."""
-    db = SessionLocal()
+def render_admin_professors(db, chat_id: int, message_id: int = None):
+    """Render the professor management list, editing message_id in place if given."""
+    professors = crud.get_all_professors(db)
+    markup = types.InlineKeyboardMarkup()
     
-    try:
-        professors = crud.get_all_professors(db)
-        
-        if not professors:
-            markup = types.InlineKeyboardMarkup()
-            markup.row(types.InlineKeyboardButton("◀️ Back", callback_data="back_admin_dashboard"))
-            
-            bot.edit_message_text(
-                "📭 No professors yet",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
-            bot.answer_callback_query(call.id)
-            return
-        
+    if not professors:
+        text = "📭 No professors yet"
+    else:
         text = f"👨‍🏫 All Professors ({len(professors)}):\n\n"
         
         for prof in professors:
@@ -2688,8 +2700,6 @@ def handle_admin_professors(call):
                 text += f"  📚 No course assigned\n"
             text += "\n"
         
-        markup = types.InlineKeyboardMarkup()
-        
         # Add action buttons for each professor
         for prof in professors[:10]:  # Limit to 10
             row = []
@@ -2697,301 +2707,231 @@ def handle_admin_professors(call):
             row.append(types.InlineKeyboardButton("🗑", callback_data=f"delete_prof_{prof.id}"))
             row.append(types.InlineKeyboardButton("📚", callback_data=f"assign_prof_{prof.id}"))
             markup.row(*row)
-        
-        markup.row(types.InlineKeyboardButton("◀️ Back", callback_data="back_admin_dashboard"))
-        
-        bot.edit_message_text(text, call.message.chat.id, call.message.message_id, reply_markup=markup)
-        bot.answer_callback_query(call.id)
     
-    finally:
-        db.close()
+    markup.row(types.InlineKeyboardButton("◀️ Back", callback_data="back_admin_dashboard"))
+    
+    if message_id is None:
+        bot.send_message(chat_id, text, reply_markup=markup)
+    else:
+        bot.edit_message_text(text, chat_id, message_id, reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda call: call.data == 'admin_professors')
+@with_session
+def handle_admin_professors(call, db):
+    """Show all professors with management options."""
+    render_admin_professors(db, call.message.chat.id, call.message.message_id)
+    bot.answer_callback_query(call.id)
 
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('edit_prof_'))
-def handle_edit_professor(call):
+@with_session
+def handle_edit_professor(call, db):
     """Start professor edit flow."""
     professor_id = int(call.data.split('_')[2])
-    db = SessionLocal()
     
-    try:
-        professor = crud.get_professor_by_id(db, professor_id)
-        if not professor:
-            bot.answer_callback_query(call.id, "❌ Professor not found!")
-            return
-        
-        session = get_session(call.from_user.id)
-        session["data"]["edit_professor_id"] = professor_id
-        session["state"] = "admin_edit_professor_name"
-        
-        bot.edit_message_text(
-            f"✏️ Edit Professor\n\nCurrent name: {professor.name}\n\nEnter new name:",
-            call.message.chat.id,
-            call.message.message_id
-        )
-        bot.answer_callback_query(call.id)
+    professor = crud.get_professor_by_id(db, professor_id)
+    if not professor:
+        bot.answer_callback_query(call.id, "❌ Professor not found!")
+        return
     
-    finally:
-        db.close()
+    session = get_session(call.from_user.id)
+    session["data"]["edit_professor_id"] = professor_id
+    session["state"] = "admin_edit_professor_name"
+    
+    bot.edit_message_text(
+        f"✏️ Edit Professor\n\nCurrent name: {professor.name}\n\nEnter new name:",
+        call.message.chat.id,
+        call.message.message_id
+    )
+    bot.answer_callback_query(call.id)
 
 
 @bot.message_handler(func=lambda m: get_session(m.from_user.id).get("state") == "admin_edit_professor_name")
-def handle_edit_professor_name(message):
+@with_session
+def handle_edit_professor_name(message, db):
     """Handle professor name edit."""
-    db = SessionLocal()
+    session = get_session(message.from_user.id)
+    professor_id = session["data"].get("edit_professor_id")
     
-    try:
-        session = get_session(message.from_user.id)
-        professor_id = session["data"].get("edit_professor_id")
-        
-        if not professor_id:
-            bot.send_message(message.chat.id, "❌ Session expired. Please start over.")
-            show_admin_dashboard(message.chat.id)
-            return
-        
-        new_name = message.text.strip()
-        
-        if not new_name:
-            bot.send_message(
-                message.chat.id,
-                "❌ Professor name cannot be empty!",
-                reply_markup=types.ReplyKeyboardRemove()
-            )
-            return
-        
-        professor = crud.update_professor(db, professor_id, name=new_name)
-        
-        if not professor:
-            bot.send_message(message.chat.id, "❌ Professor not found!")
-            show_admin_dashboard(message.chat.id)
-            return
-        
-        session["state"] = None
-        
+    if not professor_id:
+        bot.send_message(message.chat.id, "❌ Session expired. Please start over.")
+        show_admin_dashboard(message.chat.id)
+        return
+    
+    new_name = message.text.strip()
+    
+    if not new_name:
         bot.send_message(
             message.chat.id,
-            f"✅ Professor updated: '{professor.name}'!",
+            "❌ Professor name cannot be empty!",
             reply_markup=types.ReplyKeyboardRemove()
         )
+        return
+    
+    professor = crud.update_professor(db, professor_id, name=new_name)
+    
+    if not professor:
+        bot.send_message(message.chat.id, "❌ Professor not found!")
         show_admin_dashboard(message.chat.id)
+        return
     
-    finally:
-        db.close()
+    session["state"] = None
+    
+    bot.send_message(
+        message.chat.id,
+        f"✅ Professor updated: '{professor.name}'!",
+        reply_markup=types.ReplyKeyboardRemove()
+    )
+    show_admin_dashboard(message.chat.id)
 
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('delete_prof_'))
-def handle_delete_professor(call):
+@with_session
+def handle_delete_professor(call, db):
     """Show confirmation before deleting professor."""
     professor_id = int(call.data.split('_')[2])
-    db = SessionLocal()
     
-    try:
-        professor = crud.get_professor_by_id(db, professor_id)
-        if not professor:
-            bot.answer_callback_query(call.id, "❌ Professor not found!")
-            return
-        
-        # Count uploads
-        upload_count = db.query(models.Material).filter(models.Material.uploader_id == professor_id).count()
-        
-        markup = types.InlineKeyboardMarkup()
-        markup.row(
-            types.InlineKeyboardButton("✅ Confirm Delete", callback_data=f"confirm_delete_prof_{professor_id}"),
-            types.InlineKeyboardButton("❌ Cancel", callback_data="admin_professors")
-        )
-        
-        warning = f"⚠️ Delete Professor?\n\nName: {professor.name}\nCode: {professor.code}\n\n"
-        if upload_count > 0:
-            warning += f"This professor has {upload_count} uploaded material(s).\nMaterials will remain but won't be linked to this professor.\n\n"
-        warning += "This action cannot be undone!"
-        
-        bot.edit_message_text(warning, call.message.chat.id, call.message.message_id, reply_markup=markup)
-        bot.answer_callback_query(call.id)
+    professor = crud.get_professor_by_id(db, professor_id)
+    if not professor:
+        bot.answer_callback_query(call.id, "❌ Professor not found!")
+        return
     
-    finally:
-        db.close()
+    # Count uploads
+    upload_count = db.query(models.Material).filter(models.Material.uploader_id == professor_id).count()
+    
+    markup = types.InlineKeyboardMarkup()
+    markup.row(
+        types.InlineKeyboardButton("✅ Confirm Delete", callback_data=f"confirm_delete_prof_{professor_id}"),
+        types.InlineKeyboardButton("❌ Cancel", callback_data="admin_professors")
+    )
+    
+    warning = f"⚠️ Delete Professor?\n\nName: {professor.name}\nCode: {professor.code}\n\n"
+    if upload_count > 0:
+        warning += f"This professor has {upload_count} uploaded material(s).\nMaterials will remain but won't be linked to this professor.\n\n"
+    warning += "This action cannot be undone!"
+    
+    bot.edit_message_text(warning, call.message.chat.id, call.message.message_id, reply_markup=markup)
+    bot.answer_callback_query(call.id)
 
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('confirm_delete_prof_'))
-def handle_confirm_delete_professor(call):
+@with_session
+def handle_confirm_delete_professor(call, db):
     """Confirm and delete professor."""
     professor_id = int(call.data.split('_')[3])
-    db = SessionLocal()
     
-    try:
-        professor = crud.get_professor_by_id(db, professor_id)
-        name = professor.name if professor else "Unknown"
-        
-        if crud.delete_professor(db, professor_id):
-            bot.answer_callback_query(call.id, f"✅ '{name}' deleted!")
-            success = True
-        else:
-            bot.answer_callback_query(call.id, "❌ Failed to delete")
-            success = False
+    professor = crud.get_professor_by_id(db, professor_id)
+    name = professor.name if professor else "Unknown"
     
-    finally:
-        db.close()
+    if not crud.delete_professor(db, professor_id):
+        bot.answer_callback_query(call.id, "❌ Failed to delete")
+        return
     
-    # Show professor list with fresh session
-    if success:
-        bot.delete_message(call.message.chat.id, call.message.message_id)
-        db = SessionLocal()
-        try:
-            professors = crud.get_all_professors(db)
-            
-            if not professors:
-                markup = types.InlineKeyboardMarkup()
-                markup.row(types.InlineKeyboardButton("◀️ Back", callback_data="back_admin_dashboard"))
-                bot.send_message(call.message.chat.id, "📭 No professors yet", reply_markup=markup)
-                return
-            
-            text = f"👨‍🏫 All Professors ({len(professors)}):\n\n"
-            
-            for prof in professors:
-                text += f"• {prof.name}\n"
-                text += f"  🔑 Code: {prof.code}\n"
-                text += f"  {'✅' if prof.telegram_id else '❌'} Telegram\n"
-                text += f"  {'🟢' if prof.active else '🔴'} {'Active' if prof.active else 'Inactive'}\n"
-                if prof.course_id:
-                    course = crud.get_course_by_id(db, prof.course_id)
-                    if course:
-                        text += f"  📚 {course.name}\n"
-                else:
-                    text += f"  📚 No course assigned\n"
-                text += "\n"
-            
-            markup = types.InlineKeyboardMarkup()
-            for prof in professors[:10]:
-                row = []
-                row.append(types.InlineKeyboardButton(f"✏️ {prof.name[:20]}", callback_data=f"edit_prof_{prof.id}"))
-                row.append(types.InlineKeyboardButton("🗑", callback_data=f"delete_prof_{prof.id}"))
-                row.append(types.InlineKeyboardButton("📚", callback_data=f"assign_prof_{prof.id}"))
-                markup.row(*row)
-            
-            markup.row(types.InlineKeyboardButton("◀️ Back", callback_data="back_admin_dashboard"))
-            bot.send_message(call.message.chat.id, text, reply_markup=markup)
-        finally:
-            db.close()
+    bot.answer_callback_query(call.id, f"✅ '{name}' deleted!")
+    
+    # Show professor list
+    bot.delete_message(call.message.chat.id, call.message.message_id)
+    render_admin_professors(db, call.message.chat.id)
 
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('assign_prof_'))
-def handle_assign_professor(call):
+@with_session
+def handle_assign_professor(call, db):
     """Start course assignment flow."""
     try:
         print(f"🔍 DEBUG: assign_prof handler called with data: {call.data}")
         professor_id = int(call.data.split('_')[2])
-        db = SessionLocal()
         
-        try:
-            professor = crud.get_professor_by_id(db, professor_id)
-            if not professor:
-                print(f"❌ DEBUG: Professor {professor_id} not found")
-                bot.answer_callback_query(call.id, "❌ Professor not found!")
-                return
-            
-            print(f"✅ DEBUG: Professor found: {professor.name}")
-            
-            courses = crud.get_all_courses(db)
-            
-            if not courses:
-                bot.answer_callback_query(call.id, "❌ No courses available!")
-                return
-            
-            session = get_session(call.from_user.id)
-            session["data"]["assign_professor_id"] = professor_id
-            
-            markup = types.InlineKeyboardMarkup()
-            
-            # Group courses by university and major
-            for course in courses[:20]:  # Limit to 20
-                course_label = f"{course.name} (Y{course.year})"
-                markup.row(types.InlineKeyboardButton(
-                    course_label[:40],
-                    callback_data=f"assign_course_{professor_id}_{course.id}"
-                ))
-            
-            # Add unassign option
-            if professor.course_id:
-                markup.row(types.InlineKeyboardButton("❌ Unassign Course", callback_data=f"unassign_prof_{professor_id}"))
-            
-            markup.row(types.InlineKeyboardButton("◀️ Cancel", callback_data="admin_professors"))
-            
-            current_course = ""
-            if professor.course_id:
-                course = crud.get_course_by_id(db, professor.course_id)
-                if course:
-                    current_course = f"\nCurrent: {course.name}"
-            
-            bot.edit_message_text(
-                f"📚 Assign Course\n\nProfessor: {professor.name}{current_course}\n\nSelect a course:",
-                call.message.chat.id,
-                call.message.message_id,
-                reply_markup=markup
-            )
-            bot.answer_callback_query(call.id)
+        professor = crud.get_professor_by_id(db, professor_id)
+        if not professor:
+            print(f"❌ DEBUG: Professor {professor_id} not found")
+            bot.answer_callback_query(call.id, "❌ Professor not found!")
+            return
         
-        finally:
-            db.close()
+        print(f"✅ DEBUG: Professor found: {professor.name}")
+        
+        courses = crud.get_all_courses(db)
+        
+        if not courses:
+            bot.answer_callback_query(call.id, "❌ No courses available!")
+            return
+        
+        session = get_session(call.from_user.id)
+        session["data"]["assign_professor_id"] = professor_id
+        
+        markup = types.InlineKeyboardMarkup()
+        
+        # Group courses by university and major
+        for course in courses[:20]:  # Limit to 20
+            course_label = f"{course.name} (Y{course.year})"
+            markup.row(types.InlineKeyboardButton(
+                course_label[:40],
+                callback_data=f"assign_course_{professor_id}_{course.id}"
+            ))
+        
+        # Add unassign option
+        if professor.course_id:
+            markup.row(types.InlineKeyboardButton("❌ Unassign Course", callback_data=f"unassign_prof_{professor_id}"))
+        
+        markup.row(types.InlineKeyboardButton("◀️ Cancel", callback_data="admin_professors"))
+        
+        current_course = ""
+        if professor.course_id:
+            course = crud.get_course_by_id(db, professor.course_id)
+            if course:
+                current_course = f"\nCurrent: {course.name}"
+        
+        bot.edit_message_text(
+            f"📚 Assign Course\n\nProfessor: {professor.name}{current_course}\n\nSelect a course:",
+            call.message.chat.id,
+            call.message.message_id,
+            reply_markup=markup
+        )
+        bot.answer_callback_query(call.id)
     
     except Exception as e:
         print(f"❌ ERROR in handle_assign_professor: {e}")
-        import traceback
         traceback.print_exc()
         bot.answer_callback_query(call.id, f"❌ Error: {str(e)}")
 
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('assign_course_'))
-def handle_assign_course_confirm(call):
+@with_session
+def handle_assign_course_confirm(call, db):
     """Confirm course assignment."""
     parts = call.data.split('_')
     professor_id = int(parts[2])
     course_id = int(parts[3])
     
-    db = SessionLocal()
+    professor = crud.update_professor_course(db, professor_id, course_id)
+    course = crud.get_course_by_id(db, course_id)
     
-    try:
-        professor = crud.update_professor_course(db, professor_id, course_id)
-        course = crud.get_course_by_id(db, course_id)
-        
-        if professor and course:
-            bot.answer_callback_query(call.id, f"✅ Assigned to {course.name}")
-            success = True
-        else:
-            bot.answer_callback_query(call.id, "❌ Assignment failed")
-            success = False
+    if not (professor and course):
+        bot.answer_callback_query(call.id, "❌ Assignment failed")
+        return
     
-    finally:
-        db.close()
+    bot.answer_callback_query(call.id, f"✅ Assigned to {course.name}")
     
     # Return to professor list
-    if success:
-        call.data = "admin_professors"
-        handle_admin_professors(call)
+    render_admin_professors(db, call.message.chat.id, call.message.message_id)
 
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('unassign_prof_'))
-def handle_unassign_professor(call):
+@with_session
+def handle_unassign_professor(call, db):
     """Unassign professor from course."""
     professor_id = int(call.data.split('_')[2])
-    db = SessionLocal()
     
-    try:
-        professor = crud.get_professor_by_id(db, professor_id)
-        if professor:
-            professor.course_id = None
-            db.commit()
-            bot.answer_callback_query(call.id, "✅ Course unassigned")
-            success = True
-        else:
-            bot.answer_callback_query(call.id, "❌ Professor not found")
-            success = False
+    professor = crud.update_professor_course(db, professor_id, None)
+    if not professor:
+        bot.answer_callback_query(call.id, "❌ Professor not found")
+        return
     
-    finally:
-        db.close()
+    bot.answer_callback_query(call.id, "✅ Course unassigned")
     
     # Return to professor list
-    if success:
-        call.data = "admin_professors"
-        handle_admin_professors(call)
+    render_admin_professors(db, call.message.chat.id, call.message.message_id)
 
 
 @bot.callback_query_handler(func=lambda call: call.data == 'back_admin_dashboard')
@@ -4,47 +4,67 @@ Configuration module for loading and validating environment variables.
 
 import os
 from pathlib import Path
+from typing import NamedTuple
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 
-class Config:
-    """Application configuration from environment variables."""
+class Config(NamedTuple):
+    """Application configuration from environment variables (immutable)."""
     
     # Telegram
-    TELEGRAM_TOKEN: str = os.getenv("TELEGRAM_TOKEN", "")
-    BOT_OWNER_TELEGRAM_ID: int = int(os.getenv("BOT_OWNER_TELEGRAM_ID", "0"))
-    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
+    TELEGRAM_TOKEN: str
+    BOT_OWNER_TELEGRAM_ID: int
+    WEBHOOK_URL: str
     
     # Admin
-    ADMIN_CODE: str = os.getenv("ADMIN_CODE", "ADMINSECRET123")
+    ADMIN_CODE: str
     
     # Database
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./coursemate.db")
+    DATABASE_URL: str
     
     # Storage
-    STORAGE_ROOT: Path = Path(os.getenv("STORAGE_ROOT", "./storage"))
+    STORAGE_ROOT: Path
+    EXTRACT_CACHE_DIR: Path
+    EXTRACT_TIMEOUT_SECONDS: int  # 0 runs extraction in-process with no limit
     
     # AI Provider
-    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
-    AI_MODEL: str = os.getenv("AI_MODEL", "gpt-4o-mini")
+    OPENAI_API_KEY: str
+    AI_MODEL: str
     
     # Rate Limiting
-    PROF_RATE_LIMIT_PER_DAY: int = int(os.getenv("PROF_RATE_LIMIT_PER_DAY", "50"))
+    PROF_RATE_LIMIT_PER_DAY: int
     
     # Quiz Settings
-    QUIZ_QUESTIONS_DEFAULT: int = int(os.getenv("QUIZ_QUESTIONS_DEFAULT", "5"))
+    QUIZ_QUESTIONS_DEFAULT: int
     
-    @classmethod
-    def validate(cls):
+    def validate(self):
         """Validate required configuration."""
-        if not cls.TELEGRAM_TOKEN:
+        if not self.TELEGRAM_TOKEN:
             raise ValueError("TELEGRAM_TOKEN is required")
-        if not cls.OPENAI_API_KEY:
+        if not self.OPENAI_API_KEY:
             print("Warning: OPENAI_API_KEY not set. Quiz generation will fail.")
         return True
 
 
-config = Config()
+def load_config() -> Config:
+    """Build configuration from the environment, parsing values eagerly."""
+    return Config(
+        TELEGRAM_TOKEN=os.getenv("TELEGRAM_TOKEN", ""),
+        BOT_OWNER_TELEGRAM_ID=int(os.getenv("BOT_OWNER_TELEGRAM_ID", "0")),
+        WEBHOOK_URL=os.getenv("WEBHOOK_URL", ""),
+        ADMIN_CODE=os.getenv("ADMIN_CODE", "ADMINSECRET123"),
+        DATABASE_URL=os.getenv("DATABASE_URL", "sqlite:///./coursemate.db"),
+        STORAGE_ROOT=Path(os.getenv("STORAGE_ROOT", "./storage")),
+        EXTRACT_CACHE_DIR=Path(os.getenv("EXTRACT_CACHE_DIR", "./.cache/extracted")),
+        EXTRACT_TIMEOUT_SECONDS=int(os.getenv("EXTRACT_TIMEOUT_SECONDS", "30")),
+        OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", ""),
+        AI_MODEL=os.getenv("AI_MODEL", "gpt-4o-mini"),
+        PROF_RATE_LIMIT_PER_DAY=int(os.getenv("PROF_RATE_LIMIT_PER_DAY", "50")),
+        QUIZ_QUESTIONS_DEFAULT=int(os.getenv("QUIZ_QUESTIONS_DEFAULT", "5")),
+    )
+
+
+config = load_config()
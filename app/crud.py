@@ -2,16 +2,130 @@
 CRUD operations for database models.
 """
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from typing import Optional, List, Dict, Any
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached, raiseload
+from sqlalchemy import and_, bindparam, delete, event, func, literal, select, inspect, insert, true, union_all, update
+from sqlalchemy.exc import IntegrityError
 from app import models
 
+# Rows per INSERT batch in bulk_create
+BULK_CHUNK_SIZE = 10000
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with per-entry expiry."""
+    
+    MISSING = object()
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return cached value or TTLCache.MISSING if absent/expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return self.MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return self.MISSING
+            return value
+    
+    def set(self, key, value):
+        """Store value, evicting the oldest entry when full."""
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.monotonic() + self.ttl, value)
+    
+    def pop(self, key):
+        """Drop a single entry."""
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._data.clear()
+
+
+# University/major listings are keyed by a version that every committed write
+# bumps, so stale entries become unreachable immediately and age out via TTL.
+catalog_cache = TTLCache(maxsize=256, ttl=60)
+_catalog_version = 0
+_catalog_version_lock = threading.Lock()
+_CATALOG_MODELS = (models.University, models.Major)
+
+
+def _mark_catalog_changed(db: Session) -> None:
+    """Invalidate cached university/major listings once db's transaction commits."""
+    db.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_catalog_version(session: Session) -> None:
+    """Bump the listing version only after the write is visible to other sessions."""
+    global _catalog_version
+    if session.info.pop("catalog_changed", False):
+        with _catalog_version_lock:
+            _catalog_version += 1
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_catalog_change(session: Session, previous_transaction) -> None:
+    """Drop a pending invalidation when the write is rolled back."""
+    if previous_transaction.parent is None:
+        session.info.pop("catalog_changed", None)
+
+
+# Prebuilt statements for hot lookups; reusing the same construct keeps
+# SQLAlchemy's compiled cache warm and skips rebuilding the expression tree.
+_PROFESSOR_BY_CODE = select(models.Professor).where(models.Professor.code == bindparam("code"))
+_STUDENT_BY_TELEGRAM_ID = select(models.Student).where(
+    models.Student.telegram_id == bindparam("telegram_id")
+)
+# populate_existing: counts are bumped by a Core UPSERT the ORM can't see
+_RATE_LIMIT_LOOKUP = select(models.RateLimit).where(
+    models.RateLimit.professor_id == bindparam("professor_id"),
+    models.RateLimit.action_type == bindparam("action_type"),
+    models.RateLimit.date == bindparam("date")
+).execution_options(populate_existing=True)
+
+
+def _snapshot(obj) -> Optional[dict]:
+    """Capture column values of an ORM instance for caching."""
+    if obj is None:
+        return None
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _restore(db: Session, model, values: Optional[dict]):
+    """Attach a cached snapshot to the session without emitting SQL."""
+    if values is None:
+        return None
+    mapper = inspect(model)
+    key = mapper.identity_key_from_primary_key([values[col.key] for col in mapper.primary_key])
+    existing = db.identity_map.get(key)
+    if existing is not None:
+        return existing
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return db.merge(obj, load=False)
+
 
 # Admin operations
 def get_admin_by_telegram_id(db: Session, telegram_id: str) -> Optional[models.Admin]:
     """Get admin by Telegram ID."""
+    # Not cached: the API and bot run as separate processes, and an in-process
+    # cache would keep honouring revoked access in the other one
     return db.query(models.Admin).filter(models.Admin.telegram_id == telegram_id).first()
 
 
@@ -20,19 +134,24 @@ def create_admin(db: Session, telegram_id: str) -> models.Admin:
     admin = models.Admin(telegram_id=telegram_id)
     db.add(admin)
     db.commit()
-    db.refresh(admin)
     return admin
 
 
 # University operations
 def get_all_universities(db: Session) -> List[models.University]:
-    """Get all universities."""
-    return db.query(models.University).order_by(models.University.name).all()
+    """Get all universities (cached)."""
+    key = ("universities", _catalog_version)
+    cached = catalog_cache.get(key)
+    if cached is not TTLCache.MISSING:
+        return [_restore(db, models.University, values) for values in cached]
+    universities = db.query(models.University).order_by(models.University.name).all()
+    catalog_cache.set(key, [_snapshot(u) for u in universities])
+    return universities
 
 
 def get_university_by_id(db: Session, university_id: int) -> Optional[models.University]:
     """Get university by ID."""
-    return db.query(models.University).filter(models.University.id == university_id).first()
+    return db.get(models.University, university_id)
 
 
 def get_university_by_name(db: Session, name: str) -> Optional[models.University]:
@@ -40,12 +159,15 @@ def get_university_by_name(db: Session, name: str) -> Optional[models.University
     return db.query(models.University).filter(models.University.name == name).first()
 
 
-def create_university(db: Session, name: str) -> models.University:
-    """Create new university."""
+def create_university(db: Session, name: str, commit: bool = True) -> models.University:
+    """Create new university (flush only when commit=False)."""
     university = models.University(name=name)
     db.add(university)
+    _mark_catalog_changed(db)
+    if not commit:
+        db.flush()
+        return university
     db.commit()
-    db.refresh(university)
     return university
 
 
@@ -54,6 +176,7 @@ def update_university(db: Session, university_id: int, name: str) -> models.Univ
     university = get_university_by_id(db, university_id)
     if university:
         university.name = name
+        _mark_catalog_changed(db)
         db.commit()
         db.refresh(university)
     return university
@@ -64,6 +187,7 @@ def delete_university(db: Session, university_id: int) -> bool:
     university = get_university_by_id(db, university_id)
     if university:
         db.delete(university)
+        _mark_catalog_changed(db)
         db.commit()
         return True
     return False
@@ -71,15 +195,21 @@ def delete_university(db: Session, university_id: int) -> bool:
 
 # Major operations
 def get_majors_by_university(db: Session, university_id: int) -> List[models.Major]:
-    """Get all majors for a university."""
-    return db.query(models.Major).filter(
+    """Get all majors for a university (cached)."""
+    key = ("majors", university_id, _catalog_version)
+    cached = catalog_cache.get(key)
+    if cached is not TTLCache.MISSING:
+        return [_restore(db, models.Major, values) for values in cached]
+    majors = db.query(models.Major).filter(
         models.Major.university_id == university_id
     ).order_by(models.Major.name).all()
+    catalog_cache.set(key, [_snapshot(m) for m in majors])
+    return majors
 
 
 def get_major_by_id(db: Session, major_id: int) -> Optional[models.Major]:
     """Get major by ID."""
-    return db.query(models.Major).filter(models.Major.id == major_id).first()
+    return db.get(models.Major, major_id)
 
 
 def get_major_by_name(db: Session, university_id: int, name: str) -> Optional[models.Major]:
@@ -92,12 +222,15 @@ def get_major_by_name(db: Session, university_id: int, name: str) -> Optional[mo
     ).first()
 
 
-def create_major(db: Session, university_id: int, name: str) -> models.Major:
-    """Create new major."""
+def create_major(db: Session, university_id: int, name: str, commit: bool = True) -> models.Major:
+    """Create new major (flush only when commit=False)."""
     major = models.Major(university_id=university_id, name=name)
     db.add(major)
+    _mark_catalog_changed(db)
+    if not commit:
+        db.flush()
+        return major
     db.commit()
-    db.refresh(major)
     return major
 
 
@@ -106,6 +239,7 @@ def update_major(db: Session, major_id: int, name: str) -> models.Major:
     major = get_major_by_id(db, major_id)
     if major:
         major.name = name
+        _mark_catalog_changed(db)
         db.commit()
         db.refresh(major)
     return major
@@ -116,6 +250,7 @@ def delete_major(db: Session, major_id: int) -> bool:
     major = get_major_by_id(db, major_id)
     if major:
         db.delete(major)
+        _mark_catalog_changed(db)
         db.commit()
         return True
     return False
@@ -124,7 +259,8 @@ def delete_major(db: Session, major_id: int) -> bool:
 # Professor operations
 def get_professor_by_code(db: Session, code: str) -> Optional[models.Professor]:
     """Get professor by authentication code."""
-    return db.query(models.Professor).filter(models.Professor.code == code).first()
+    # Not cached, so deactivated or deleted codes stop working in every process at once
+    return db.execute(_PROFESSOR_BY_CODE, {"code": code}).scalars().first()
 
 
 def get_professor_by_telegram_id(db: Session, telegram_id: str) -> Optional[models.Professor]:
@@ -137,13 +273,12 @@ def create_professor(db: Session, name: str, code: str, course_id: Optional[int]
     professor = models.Professor(name=name, code=code, course_id=course_id, active=True)
     db.add(professor)
     db.commit()
-    db.refresh(professor)
     return professor
 
 
 def link_professor_telegram(db: Session, professor_id: int, telegram_id: str) -> models.Professor:
     """Link Telegram ID to professor."""
-    professor = db.query(models.Professor).filter(models.Professor.id == professor_id).first()
+    professor = db.get(models.Professor, professor_id)
     if professor:
         professor.telegram_id = telegram_id
         db.commit()
@@ -151,9 +286,9 @@ def link_professor_telegram(db: Session, professor_id: int, telegram_id: str) ->
     return professor
 
 
-def update_professor_course(db: Session, professor_id: int, course_id: int) -> models.Professor:
+def update_professor_course(db: Session, professor_id: int, course_id: Optional[int]) -> models.Professor:
     """Update professor's assigned course."""
-    professor = db.query(models.Professor).filter(models.Professor.id == professor_id).first()
+    professor = db.get(models.Professor, professor_id)
     if professor:
         professor.course_id = course_id
         db.commit()
@@ -168,12 +303,12 @@ def get_all_professors(db: Session) -> List[models.Professor]:
 
 def get_professor_by_id(db: Session, professor_id: int) -> Optional[models.Professor]:
     """Get professor by ID."""
-    return db.query(models.Professor).filter(models.Professor.id == professor_id).first()
+    return db.get(models.Professor, professor_id)
 
 
 def update_professor(db: Session, professor_id: int, name: str = None, code: str = None, active: bool = None) -> Optional[models.Professor]:
     """Update professor details."""
-    professor = db.query(models.Professor).filter(models.Professor.id == professor_id).first()
+    professor = db.get(models.Professor, professor_id)
     if not professor:
         return None
     
@@ -191,7 +326,7 @@ def update_professor(db: Session, professor_id: int, name: str = None, code: str
 
 def delete_professor(db: Session, professor_id: int) -> bool:
     """Delete professor."""
-    professor = db.query(models.Professor).filter(models.Professor.id == professor_id).first()
+    professor = db.get(models.Professor, professor_id)
     if not professor:
         return False
     
@@ -208,7 +343,7 @@ def get_student_by_university_id(db: Session, university_id: str) -> Optional[mo
 
 def get_student_by_telegram_id(db: Session, telegram_id: str) -> Optional[models.Student]:
     """Get student by Telegram ID."""
-    return db.query(models.Student).filter(models.Student.telegram_id == telegram_id).first()
+    return db.execute(_STUDENT_BY_TELEGRAM_ID, {"telegram_id": telegram_id}).scalars().first()
 
 
 def create_student(db: Session, university_id: str, db_university_id: int, db_major_id: int, 
@@ -226,13 +361,67 @@ def create_student(db: Session, university_id: str, db_university_id: int, db_ma
     )
     db.add(student)
     db.commit()
-    db.refresh(student)
     return student
 
 
+def bulk_create(db: Session, model, rows: List[dict], chunk_size: int = BULK_CHUNK_SIZE) -> int:
+    """
+    Insert many rows with executemany-style INSERTs and a single commit.
+    
+    Rows are plain column dicts; no ORM instances are built or refreshed.
+    Returns the number of rows inserted.
+    """
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(model), rows[start:start + chunk_size])
+    if model in _CATALOG_MODELS:
+        _mark_catalog_changed(db)
+    db.commit()
+    # Core inserts skip the ORM events that maintain the stats counters
+    refresh_stats_counters(db, model)
+    return len(rows)
+
+
+def bulk_create_students(db: Session, rows: List[dict]) -> int:
+    """Bulk-insert students from column dicts (see create_student for fields)."""
+    return bulk_create(db, models.Student, rows)
+
+
+def bulk_create_missing(db: Session, model, rows: List[dict], index_elements: List[str]) -> int:
+    """
+    Insert rows that do not collide with an existing unique key, and commit.
+    
+    Uses a single INSERT ... ON CONFLICT DO NOTHING where the dialect has it.
+    index_elements names the unique columns to check. Returns the number of
+    rows actually inserted.
+    """
+    if not rows:
+        return 0
+    insert_stmt = _upsert_insert(db)
+    
+    if insert_stmt is not None:
+        result = db.execute(insert_stmt(model).values(rows).on_conflict_do_nothing(index_elements=index_elements))
+        inserted = result.rowcount
+    else:
+        inserted = 0
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(model).values(row))
+                inserted += 1
+            except IntegrityError:
+                pass
+    
+    if inserted and model in _CATALOG_MODELS:
+        _mark_catalog_changed(db)
+    db.commit()
+    # Core inserts skip the ORM events that maintain the stats counters
+    refresh_stats_counters(db, model)
+    return inserted
+
+
 def verify_student(db: Session, student_id: int, telegram_id: str) -> models.Student:
     """Verify student and link Telegram ID."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
+    student = db.get(models.Student, student_id)
     if student:
         student.verified = True
         student.telegram_id = telegram_id
@@ -244,20 +433,23 @@ def verify_student(db: Session, student_id: int, telegram_id: str) -> models.Stu
 
 def get_pending_students(db: Session) -> List[models.Student]:
     """Get all pending (unverified) students."""
-    return db.query(models.Student).filter(models.Student.verified == False).all()
+    return db.query(models.Student).filter(
+        models.Student.verified == False
+    ).order_by(models.Student.created_at).all()
 
 
 def reject_student(db: Session, student_id: int):
     """Delete/reject pending student."""
-    student = db.query(models.Student).filter(models.Student.id == student_id).first()
+    student = db.get(models.Student, student_id)
     if student:
         db.delete(student)
         db.commit()
 
 
 # Course operations
-def create_course(db: Session, university_id: int, major_id: int, year: str, name: str) -> models.Course:
-    """Create new course."""
+def create_course(db: Session, university_id: int, major_id: int, year: str, name: str,
+                  commit: bool = True) -> models.Course:
+    """Create new course (flush only when commit=False)."""
     course = models.Course(
         university_id=university_id,
         major_id=major_id,
@@ -265,12 +457,15 @@ def create_course(db: Session, university_id: int, major_id: int, year: str, nam
         name=name
     )
     db.add(course)
+    if not commit:
+        db.flush()
+        return course
     db.commit()
-    db.refresh(course)
     return course
 
 
-def get_or_create_course(db: Session, university_id: int, major_id: int, year: str, name: str) -> models.Course:
+def get_or_create_course(db: Session, university_id: int, major_id: int, year: str, name: str,
+                         commit: bool = True) -> models.Course:
     """Get existing course or create new one."""
     course = db.query(models.Course).filter(
         and_(
@@ -282,7 +477,7 @@ def get_or_create_course(db: Session, university_id: int, major_id: int, year: s
     ).first()
     
     if not course:
-        course = create_course(db, university_id, major_id, year, name)
+        course = create_course(db, university_id, major_id, year, name, commit=commit)
     
     return course
 
@@ -312,34 +507,90 @@ def delete_course(db: Session, course_id: int) -> bool:
         return False
     
     # Unassign professors
-    professors = db.query(models.Professor).filter(models.Professor.course_id == course_id).all()
-    for prof in professors:
-        prof.course_id = None
+    db.query(models.Professor).filter(
+        models.Professor.course_id == course_id
+    ).update({models.Professor.course_id: None})
     
     # Delete quizzes for this course
-    db.query(models.Quiz).filter(models.Quiz.course_id == course_id).delete()
+    deleted_quizzes = db.query(models.Quiz).filter(models.Quiz.course_id == course_id).delete()
     
-    # Delete materials (also removes files)
-    materials = get_materials_by_course(db, course_id)
-    for mat in materials:
-        delete_material(db, mat.id)
+    # Detach any other quizzes that still point at this course's materials
+    material_ids = select(models.Material.id).where(models.Material.course_id == course_id)
+    db.query(models.Quiz).filter(
+        models.Quiz.material_id.in_(material_ids.scalar_subquery())
+    ).update({models.Quiz.material_id: None}, synchronize_session=False)
     
-    # Delete course
-    db.delete(course)
+    # Delete materials in bulk, collecting their files in the same statement
+    delete_materials = delete(models.Material).where(models.Material.course_id == course_id)
+    if db.get_bind().dialect.delete_returning:
+        filepaths = db.scalars(delete_materials.returning(models.Material.filepath)).all()
+    else:
+        filepaths = db.scalars(
+            select(models.Material.filepath).where(models.Material.course_id == course_id)
+        ).all()
+        db.execute(delete_materials)
+    
+    # Delete course (children are already handled, so skip ORM cascade loads)
+    deleted_courses = db.query(models.Course).filter(models.Course.id == course_id).delete()
+    
+    # Bulk deletes skip the ORM events that maintain the stats counters
+    connection = db.connection()
+    _adjust_stat(connection, "total_quizzes", -deleted_quizzes)
+    _adjust_stat(connection, "total_uploads", -len(filepaths))
+    _adjust_stat(connection, "total_courses", -deleted_courses)
     db.commit()
+    
+    # Remove files once the rows are gone
+    _delete_files(filepaths)
     return True
 
 
-def get_courses_by_filters(db: Session, university_id: Optional[int] = None, 
-                           major_id: Optional[int] = None, year: Optional[str] = None) -> List[models.Course]:
-    """Get courses with optional filters."""
-    query = db.query(models.Course)
+def _delete_file(relative_path: str) -> None:
+    """Delete a stored material file, ignoring it if already missing."""
+    from app.storage import get_file_path
+    try:
+        get_file_path(relative_path).unlink(missing_ok=True)
+    except Exception as e:
+        print(f"Failed to delete file: {e}")
+
+
+def _delete_files(relative_paths: List[str]) -> None:
+    """Delete stored material files concurrently to hide per-file syscall latency."""
+    if len(relative_paths) <= 1:
+        for relative_path in relative_paths:
+            _delete_file(relative_path)
+        return
+    with ThreadPoolExecutor(max_workers=min(8, len(relative_paths))) as pool:
+        list(pool.map(_delete_file, relative_paths))
+
+
+def get_courses_by_filters(db: Session, university_id: Optional[int] = None,
+                           major_id: Optional[int] = None, year: Optional[str] = None,
+                           as_rows: bool = False) -> List[Any]:
+    """
+    Get courses with optional filters.
+    
+    With as_rows=True returns plain mappings (id, name, year, university,
+    major) from one joined SELECT instead of ORM instances.
+    """
+    if as_rows:
+        query = db.query(
+            models.Course.id,
+            models.Course.name,
+            models.Course.year,
+            models.University.name.label("university"),
+            models.Major.name.label("major")
+        ).join(models.Course.university).join(models.Course.major)
+    else:
+        query = db.query(models.Course)
     if university_id:
         query = query.filter(models.Course.university_id == university_id)
     if major_id:
         query = query.filter(models.Course.major_id == major_id)
     if year:
         query = query.filter(models.Course.year == year)
+    if as_rows:
+        return [dict(row._mapping) for row in query.all()]
     return query.all()
 
 
@@ -350,13 +601,14 @@ def get_all_courses(db: Session) -> List[models.Course]:
 
 def get_course_by_id(db: Session, course_id: int) -> Optional[models.Course]:
     """Get course by ID."""
-    return db.query(models.Course).filter(models.Course.id == course_id).first()
+    return db.get(models.Course, course_id)
 
 
 # Material operations
 def create_material(db: Session, course_id: int, uploader_id: int, filename: str,
-                   filepath: str, week: str, description: Optional[str] = None) -> models.Material:
-    """Create new material."""
+                   filepath: str, week: str, description: Optional[str] = None,
+                   commit: bool = True) -> models.Material:
+    """Create new material (flush only when commit=False)."""
     material = models.Material(
         course_id=course_id,
         uploader_id=uploader_id,
@@ -366,22 +618,45 @@ def create_material(db: Session, course_id: int, uploader_id: int, filename: str
         description=description
     )
     db.add(material)
+    if not commit:
+        db.flush()
+        return material
     db.commit()
-    db.refresh(material)
     return material
 
 
-def get_materials_by_course(db: Session, course_id: int, week: Optional[str] = None) -> List[models.Material]:
-    """Get materials for a course, optionally filtered by week."""
-    query = db.query(models.Material).filter(models.Material.course_id == course_id)
+def get_materials_by_course(db: Session, course_id: int, week: Optional[str] = None,
+                            eager: bool = False) -> List[models.Material]:
+    """
+    Get materials for a course, optionally filtered by week.
+    
+    Relationships are not loaded and raise on access, unless eager is set,
+    which joins each material's course with its university and major.
+    """
+    query = db.query(models.Material)
+    if eager:
+        course = joinedload(models.Material.course)
+        query = query.options(
+            course.joinedload(models.Course.university),
+            course.joinedload(models.Course.major),
+        )
+    # Fail loudly instead of lazy-loading anything else per row
+    query = query.options(raiseload('*')).filter(models.Material.course_id == course_id)
     if week:
         query = query.filter(models.Material.week == week)
-    return query.order_by(models.Material.uploaded_at.desc()).all()
+    return query.order_by(models.Material.uploaded_at.desc(), models.Material.id.desc()).all()
 
 
 def get_material_by_id(db: Session, material_id: int) -> Optional[models.Material]:
     """Get material by ID."""
-    return db.query(models.Material).filter(models.Material.id == material_id).first()
+    return db.get(models.Material, material_id)
+
+
+def get_material_with_course(db: Session, material_id: int) -> Optional[models.Material]:
+    """Get material by ID with its course loaded in the same query."""
+    return db.query(models.Material).options(
+        joinedload(models.Material.course)
+    ).filter(models.Material.id == material_id).first()
 
 
 def get_materials_by_professor(db: Session, professor_id: int, week: Optional[str] = None) -> List[models.Material]:
@@ -389,7 +664,7 @@ def get_materials_by_professor(db: Session, professor_id: int, week: Optional[st
     query = db.query(models.Material).filter(models.Material.uploader_id == professor_id)
     if week:
         query = query.filter(models.Material.week == week)
-    return query.order_by(models.Material.week, models.Material.uploaded_at.desc()).all()
+    return query.order_by(models.Material.week, models.Material.uploaded_at.desc(), models.Material.id.desc()).all()
 
 
 def delete_material(db: Session, material_id: int) -> bool:
@@ -428,7 +703,6 @@ def create_quiz(db: Session, course_id: int, difficulty: str, data_json: str,
     )
     db.add(quiz)
     db.commit()
-    db.refresh(quiz)
     return quiz
 
 
@@ -444,24 +718,61 @@ def get_quiz_by_material(db: Session, material_id: int, difficulty: str) -> Opti
 
 def get_quiz_by_id(db: Session, quiz_id: int) -> Optional[models.Quiz]:
     """Get quiz by ID."""
-    return db.query(models.Quiz).filter(models.Quiz.id == quiz_id).first()
+    return db.get(models.Quiz, quiz_id)
 
 
 # Rate limiting operations
 def get_rate_limit(db: Session, professor_id: int, action_type: str, date_str: str) -> Optional[models.RateLimit]:
     """Get rate limit record for professor, action, and date."""
-    return db.query(models.RateLimit).filter(
-        and_(
-            models.RateLimit.professor_id == professor_id,
-            models.RateLimit.action_type == action_type,
-            models.RateLimit.date == date_str
-        )
-    ).first()
+    return db.execute(_RATE_LIMIT_LOOKUP, {
+        "professor_id": professor_id,
+        "action_type": action_type,
+        "date": date_str
+    }).scalars().first()
+
+
+def _upsert_insert(db: Session):
+    """Return the dialect-specific insert() supporting ON CONFLICT, if any."""
+    return _dialect_upsert_insert(db.get_bind().dialect.name)
+
+
+def _dialect_upsert_insert(dialect: str):
+    """Return the insert() supporting ON CONFLICT for a dialect name, if any."""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
 
 
-def increment_rate_limit(db: Session, professor_id: int, action_type: str) -> int:
-    """Increment rate limit counter and return new count."""
+def increment_rate_limit(db: Session, professor_id: int, action_type: str, commit: bool = True) -> int:
+    """
+    Increment rate limit counter and return new count.
+    
+    With commit=False the increment stays in the caller's transaction, so
+    callers can check the returned count and roll back if over the limit.
+    """
     today = date.today().isoformat()
+    insert = _upsert_insert(db)
+    
+    if insert is not None:
+        # Single atomic round-trip backed by uq_rate_limit
+        stmt = insert(models.RateLimit).values(
+            professor_id=professor_id,
+            action_type=action_type,
+            date=today,
+            count=1
+        ).on_conflict_do_update(
+            index_elements=['professor_id', 'action_type', 'date'],
+            set_={'count': models.RateLimit.count + 1}
+        ).returning(models.RateLimit.count)
+        count = db.execute(stmt).scalar_one()
+        if commit:
+            db.commit()
+        return count
+    
     rate_limit = get_rate_limit(db, professor_id, action_type, today)
     
     if not rate_limit:
@@ -475,7 +786,10 @@ def increment_rate_limit(db: Session, professor_id: int, action_type: str) -> in
     else:
         rate_limit.count += 1
     
-    db.commit()
+    if commit:
+        db.commit()
+    else:
+        db.flush()
     return rate_limit.count
 
 
@@ -505,7 +819,6 @@ def create_background_job(db: Session, job_type: str, material_id: Optional[int]
     )
     db.add(job)
     db.commit()
-    db.refresh(job)
     return job
 
 
@@ -513,7 +826,7 @@ def update_job_status(db: Session, job_id: int, status: str,
                      error_message: Optional[str] = None,
                      result_data: Optional[str] = None):
     """Update background job status."""
-    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    job = db.get(models.BackgroundJob, job_id)
     if job:
         job.status = status
         if error_message:
@@ -527,29 +840,129 @@ def update_job_status(db: Session, job_id: int, status: str,
 
 def get_job_by_id(db: Session, job_id: int) -> Optional[models.BackgroundJob]:
     """Get background job by ID."""
-    return db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    return db.get(models.BackgroundJob, job_id)
 
 
 # Statistics operations
-def get_upload_stats(db: Session) -> dict:
-    """Get upload statistics."""
-    total_uploads = db.query(models.Material).count()
-    total_courses = db.query(models.Course).count()
-    total_professors = db.query(models.Professor).count()
-    total_students = db.query(models.Student).filter(models.Student.verified == True).count()
-    total_quizzes = db.query(models.Quiz).count()
-    total_universities = db.query(models.University).count()
-    total_majors = db.query(models.Major).count()
+# Counters kept in stats_counters: name -> (model, extra criteria)
+STATS_COUNTERS = {
+    "total_uploads": (models.Material, None),
+    "total_courses": (models.Course, None),
+    "total_professors": (models.Professor, None),
+    "total_verified_students": (models.Student, models.Student.verified == True),
+    "total_quizzes": (models.Quiz, None),
+    "total_universities": (models.University, None),
+    "total_majors": (models.Major, None),
+}
+
+
+def _adjust_stat(connection, name: str, delta: int) -> None:
+    """Add delta to a stats counter inside the caller's transaction."""
+    if not delta:
+        return
+    counters = models.StatsCounter.__table__
+    upsert = _dialect_upsert_insert(connection.dialect.name)
     
-    return {
-        "total_uploads": total_uploads,
-        "total_courses": total_courses,
-        "total_professors": total_professors,
-        "total_verified_students": total_students,
-        "total_quizzes": total_quizzes,
-        "total_universities": total_universities,
-        "total_majors": total_majors
+    if upsert is not None:
+        # Single atomic statement, so two first writers can't both insert
+        connection.execute(upsert(counters).values(name=name, value=delta).on_conflict_do_update(
+            index_elements=['name'],
+            set_={'value': counters.c.value + delta}
+        ))
+        return
+    
+    result = connection.execute(
+        update(counters).where(counters.c.name == name).values(value=counters.c.value + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(counters).values(name=name, value=delta))
+
+
+def _count_listener(name: str, delta: int):
+    """Build a mapper event handler that moves one counter by delta."""
+    def listener(mapper, connection, target):
+        _adjust_stat(connection, name, delta)
+    return listener
+
+
+for _name, (_model, _criteria) in STATS_COUNTERS.items():
+    if _criteria is None:
+        event.listen(_model, "after_insert", _count_listener(_name, 1))
+        event.listen(_model, "after_delete", _count_listener(_name, -1))
+
+
+@event.listens_for(models.Student, "after_insert")
+def _count_inserted_student(mapper, connection, target):
+    """Track verified students added through the ORM."""
+    if target.verified:
+        _adjust_stat(connection, "total_verified_students", 1)
+
+
+@event.listens_for(models.Student, "after_delete")
+def _count_deleted_student(mapper, connection, target):
+    """Track verified students removed through the ORM."""
+    if target.verified:
+        _adjust_stat(connection, "total_verified_students", -1)
+
+
+@event.listens_for(models.Student, "after_update")
+def _count_student_verification(mapper, connection, target):
+    """Track students whose verified flag changed."""
+    history = inspect(target).attrs.verified.history
+    if history.has_changes():
+        was_verified = bool(history.deleted and history.deleted[0])
+        _adjust_stat(connection, "total_verified_students", int(bool(target.verified)) - int(was_verified))
+
+
+def refresh_stats_counters(db: Session, model=None) -> None:
+    """
+    Recount stats counters from the live tables and commit.
+    
+    Used at startup and after bulk writes that bypass the ORM events;
+    pass a model to recount only its counters.
+    """
+    def count_of(counted, criteria):
+        query = select(func.count()).select_from(counted)
+        if criteria is not None:
+            query = query.where(criteria)
+        return query.scalar_subquery()
+    
+    counters = {
+        name: count_of(counted, criteria)
+        for name, (counted, criteria) in STATS_COUNTERS.items()
+        if model is None or counted is model
     }
+    if not counters:
+        return
+    
+    upsert = _upsert_insert(db)
+    if upsert is not None:
+        # Count and write in one statement, so no increment lands in between.
+        # SQLite needs a WHERE on an upsert's SELECT to parse ON CONFLICT.
+        rows = union_all(*(
+            select(literal(name).label("name"), query.label("value")).where(true())
+            for name, query in counters.items()
+        ))
+        stmt = upsert(models.StatsCounter).from_select(["name", "value"], rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=['name'],
+            set_={'value': stmt.excluded.value}
+        ))
+        db.commit()
+        return
+    
+    row = db.execute(select(*(query.label(name) for name, query in counters.items()))).one()
+    db.execute(delete(models.StatsCounter).where(models.StatsCounter.name.in_(counters)))
+    db.execute(insert(models.StatsCounter), [
+        {"name": name, "value": value} for name, value in row._mapping.items()
+    ])
+    db.commit()
+
+
+def get_upload_stats(db: Session) -> dict:
+    """Get upload statistics from the maintained counters."""
+    values = dict(db.execute(select(models.StatsCounter.name, models.StatsCounter.value)).all())
+    return {name: values.get(name, 0) for name in STATS_COUNTERS}
 
 
 def get_professor_stats(db: Session, professor_id: int) -> dict:
@@ -560,16 +973,26 @@ def get_professor_stats(db: Session, professor_id: int) -> dict:
     }
 
 
+def get_professor_upload_counts(db: Session) -> Dict[int, int]:
+    """Get upload counts for all professors in one query, keyed by professor ID."""
+    rows = db.query(
+        models.Material.uploader_id, func.count(models.Material.id)
+    ).group_by(models.Material.uploader_id).all()
+    return {uploader_id: count for uploader_id, count in rows}
+
+
 def get_distinct_universities(db: Session) -> List[str]:
     """Get list of distinct universities (deprecated - use get_all_universities)."""
-    results = db.query(models.University.name).all()
-    return [r[0] for r in results if r[0]]
+    return db.scalars(
+        select(models.University.name).where(
+            models.University.name.isnot(None), models.University.name != ''
+        )
+    ).all()
 
 
 def get_distinct_majors(db: Session, university_id: Optional[int] = None) -> List[str]:
     """Get list of distinct majors (deprecated - use get_majors_by_university)."""
-    query = db.query(models.Major.name)
+    query = select(models.Major.name).where(models.Major.name.isnot(None), models.Major.name != '')
     if university_id:
-        query = query.filter(models.Major.university_id == university_id)
-    results = query.distinct().all()
-    return [r[0] for r in results if r[0]]
+        query = query.where(models.Major.university_id == university_id)
+    return db.scalars(query.distinct()).all()
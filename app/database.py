@@ -2,35 +2,107 @@
 Database configuration and session management using SQLAlchemy.
 """
 
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 from app.config import config
 
+IS_SQLITE = config.DATABASE_URL.startswith("sqlite")
+
+
+@lru_cache(maxsize=None)
+def get_engine(url: str):
+    """Get the pooled engine for a database URL, creating it once per process."""
+    is_sqlite = url.startswith("sqlite")
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "insertmanyvalues_page_size": 10000,
+    }
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    if not (is_sqlite and (":memory:" in url or url == "sqlite://")):
+        # In-memory SQLite uses a single-connection pool that takes no sizing
+        options.update(pool_size=20, max_overflow=40)
+    
+    new_engine = create_engine(url, **options)
+    
+    if is_sqlite:
+        @event.listens_for(new_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_conn, connection_record):
+            """Enable WAL so readers don't block the writer; applied once per pooled connection."""
+            cursor = dbapi_conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+    
+    return new_engine
+
+
 # Create engine
-engine = create_engine(
-    config.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in config.DATABASE_URL else {}
-)
+engine = get_engine(config.DATABASE_URL)
+
+# Create session factory. Objects stay loaded after commit so freshly
+# created rows can be used without a reload SELECT; sessions are short-lived.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Thread-local session registry shared by bot handlers
+ScopedSession = scoped_session(SessionLocal)
 
 # Base class for models
 Base = declarative_base()
 
 
 def get_db():
-    """Get database session."""
+    """Get database session, rolling back uncommitted work on error."""
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
 
+@contextmanager
+def session_scope():
+    """
+    Provide the thread-local session.
+    
+    Nested scopes reuse the outer session; only the outermost scope
+    removes it, returning the connection to the pool.
+    """
+    owner = not ScopedSession.registry.has()
+    db = ScopedSession()
+    try:
+        yield db
+    finally:
+        if owner:
+            ScopedSession.remove()
+
+
+def with_session(func):
+    """Inject the thread-local session into a handler as the ``db`` argument."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with session_scope() as db:
+            return func(*args, db=db, **kwargs)
+    return wrapper
+
+
 def init_db():
     """Initialize database tables."""
     from app import models  # Import models to register them
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so add any indexes introduced later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    # Resync the stats counters with whatever is already stored
+    from app import crud
+    with SessionLocal() as db:
+        crud.refresh_stats_counters(db)
     print("✅ Database initialized")
@@ -0,0 +1,25 @@
+"""
+JSON serialization helpers, using orjson when it is installed.
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def dumps_json(value: Any) -> str:
+    """Serialize to a JSON string, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def loads_json(data: str) -> Any:
+    """Parse a JSON string, using orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
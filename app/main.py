@@ -1,23 +1,72 @@
 """
 FastAPI application with REST endpoints for CourseMateBot.
+
+Endpoints that touch the (synchronous) database session are declared as
+plain ``def`` so FastAPI runs them in its threadpool instead of blocking
+the event loop.
 """
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request, BackgroundTasks
+from fastapi.responses import FileResponse, JSONResponse
 from sqlalchemy.orm import Session
 from pathlib import Path
 from typing import Optional, List
+import asyncio
 import os
+import traceback
+import uuid
 import telebot
 
-from app.database import get_db, init_db
+from app.database import SessionLocal, get_db, init_db
 from app import crud
-from app.storage import get_storage_path, save_uploaded_file, get_file_path, file_exists
+from app.storage import get_storage_path, save_uploaded_stream, get_file_path, file_exists
 from app.tasks import submit_quiz_generation_task, get_job_status
 from app.config import config
 
 app = FastAPI(title="CourseMateBot API", version="1.0.0")
 
+# How often the /admin/stats snapshot is recomputed
+STATS_REFRESH_SECONDS = 60
+
+
+def compute_admin_stats(db: Session) -> dict:
+    """Aggregate system statistics and per-professor upload counts."""
+    stats = crud.get_upload_stats(db)
+    
+    # Get professor details
+    professors = crud.get_all_professors(db)
+    upload_counts = crud.get_professor_upload_counts(db)
+    prof_stats = []
+    for prof in professors:
+        prof_stats.append({
+            "id": prof.id,
+            "name": prof.name,
+            "uploads": upload_counts.get(prof.id, 0),
+            "linked": prof.telegram_id is not None
+        })
+    
+    stats["professors"] = prof_stats
+    return stats
+
+
+def refresh_stats_snapshot():
+    """Recompute the cached admin stats with a dedicated session."""
+    db = SessionLocal()
+    try:
+        app.state.stats_cache = compute_admin_stats(db)
+    finally:
+        db.close()
+
+
+async def refresh_stats_periodically():
+    """Keep app.state.stats_cache fresh in the background."""
+    while True:
+        try:
+            await asyncio.to_thread(refresh_stats_snapshot)
+        except Exception as e:
+            print(f"⚠️ Failed to refresh stats snapshot: {e}")
+        await asyncio.sleep(STATS_REFRESH_SECONDS)
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -25,6 +74,10 @@ async def startup_event():
     init_db()
     config.STORAGE_ROOT.mkdir(parents=True, exist_ok=True)
     
+    # Start admin stats snapshot refresher
+    app.state.stats_cache = None
+    app.state.stats_task = asyncio.create_task(refresh_stats_periodically())
+    
     # Setup webhook if configured
     if config.WEBHOOK_URL:
         from app.bot import bot
@@ -37,6 +90,14 @@ async def startup_event():
     print("✅ FastAPI started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background refreshers."""
+    task = getattr(app.state, "stats_task", None)
+    if task:
+        task.cancel()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -44,7 +105,7 @@ async def root():
 
 
 @app.post("/upload-material/")
-async def upload_material(
+def upload_material(
     university: str = Form(...),
     major: str = Form(...),
     course: str = Form(...),
@@ -67,43 +128,48 @@ async def upload_material(
     if not professor or not professor.active:
         raise HTTPException(status_code=401, detail="Invalid professor code")
     
-    # Check rate limit
-    if not crud.check_rate_limit(db, professor.id, 'upload', config.PROF_RATE_LIMIT_PER_DAY):
-        raise HTTPException(
-            status_code=429,
-            detail=f"Upload limit reached ({config.PROF_RATE_LIMIT_PER_DAY} per day)"
-        )
-    
-    # Resolve or create university/major by name
-    uni_obj = crud.get_university_by_name(db, university) or crud.create_university(db, university)
-    major_obj = crud.get_major_by_name(db, uni_obj.id, major) or crud.create_major(db, uni_obj.id, major)
-    
-    # Get or create course (uses IDs)
-    course_obj = crud.get_or_create_course(db, uni_obj.id, major_obj.id, year, course)
-    
-    # Read file content
-    file_content = await file.read()
-    
     # Generate storage path
     full_path, relative_path = get_storage_path(university, major, course, week, file.filename)
     
-    # Save file
-    if not save_uploaded_file(file_content, full_path):
+    # Stream to a temporary sibling before touching the database, so no write
+    # transaction (and SQLite's write lock) is held during the file I/O
+    tmp_path = full_path.with_name(f".{full_path.name}.{uuid.uuid4().hex}.part")
+    if not save_uploaded_stream(file.file, tmp_path):
+        tmp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail="Failed to save file")
     
-    # Create material record
-    material = crud.create_material(
-        db,
-        course_id=course_obj.id,
-        uploader_id=professor.id,
-        filename=file.filename,
-        filepath=str(relative_path),
-        week=week,
-        description=description
-    )
-    
-    # Increment rate limit
-    crud.increment_rate_limit(db, professor.id, 'upload')
+    try:
+        # Count this upload; the increment is rolled back if we reject
+        upload_count = crud.increment_rate_limit(db, professor.id, 'upload', commit=False)
+        if upload_count > config.PROF_RATE_LIMIT_PER_DAY:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Upload limit reached ({config.PROF_RATE_LIMIT_PER_DAY} per day)"
+            )
+        
+        # Everything below joins the rate limit increment in one transaction
+        uni_obj = (crud.get_university_by_name(db, university)
+                   or crud.create_university(db, university, commit=False))
+        major_obj = (crud.get_major_by_name(db, uni_obj.id, major)
+                     or crud.create_major(db, uni_obj.id, major, commit=False))
+        course_obj = crud.get_or_create_course(db, uni_obj.id, major_obj.id, year, course, commit=False)
+        
+        material = crud.create_material(
+            db,
+            course_id=course_obj.id,
+            uploader_id=professor.id,
+            filename=file.filename,
+            filepath=str(relative_path),
+            week=week,
+            description=description,
+            commit=False
+        )
+        os.replace(tmp_path, full_path)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        tmp_path.unlink(missing_ok=True)
+        raise
     
     return {
         "material_id": material.id,
@@ -115,7 +181,7 @@ async def upload_material(
 
 
 @app.get("/materials/{material_id}/download")
-async def download_material(
+def download_material(
     material_id: int,
     telegram_id: Optional[str] = None,
     professor_code: Optional[str] = None,
@@ -126,8 +192,8 @@ async def download_material(
     
     Authorization: Student (verified) or Professor or Admin.
     """
-    # Get material
-    material = crud.get_material_by_id(db, material_id)
+    # Get material (course is joined in for the student check)
+    material = crud.get_material_with_course(db, material_id)
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
     
@@ -143,7 +209,7 @@ async def download_material(
         # Check if student
         student = crud.get_student_by_telegram_id(db, telegram_id)
         if student and student.verified:
-            course = crud.get_course_by_id(db, material.course_id)
+            course = material.course
             if course and course.major_id == student.db_major_id and course.university_id == student.db_university_id and course.year == student.year:
                 authorized = True
         
@@ -162,20 +228,16 @@ async def download_material(
     if not file_exists(material.filepath):
         raise HTTPException(status_code=404, detail="File not found on disk")
     
-    # Stream file
-    def iterfile():
-        with open(filepath, "rb") as f:
-            yield from f
-    
-    return StreamingResponse(
-        iterfile(),
-        media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={material.filename}"}
+    # Send file (uses sendfile where the server supports it)
+    return FileResponse(
+        path=filepath,
+        filename=material.filename,
+        media_type="application/octet-stream"
     )
 
 
 @app.get("/courses/")
-async def list_courses(
+def list_courses(
     university: Optional[str] = None,
     major: Optional[str] = None,
     year: Optional[str] = None,
@@ -196,25 +258,16 @@ async def list_courses(
             return {"count": 0, "courses": []}
         maj_id = maj_obj.id
     
-    courses = crud.get_courses_by_filters(db, university_id=uni_id, major_id=maj_id, year=year)
+    courses = crud.get_courses_by_filters(db, university_id=uni_id, major_id=maj_id, year=year, as_rows=True)
     
     return {
         "count": len(courses),
-        "courses": [
-            {
-                "id": c.id,
-                "university": c.university.name,
-                "major": c.major.name,
-                "year": c.year,
-                "name": c.name
-            }
-            for c in courses
-        ]
+        "courses": courses
     }
 
 
 @app.post("/admin/create-professor")
-async def create_professor(
+def create_professor(
     admin_code: str = Form(...),
     name: str = Form(...),
     code: str = Form(...),
@@ -244,35 +297,28 @@ async def create_professor(
 
 
 @app.get("/admin/stats")
-async def get_stats(
+def get_stats(
     admin_code: str,
     db: Session = Depends(get_db)
 ):
-    """Get system statistics (admin only)."""
+    """
+    Get system statistics (admin only).
+    
+    Served from a snapshot refreshed every STATS_REFRESH_SECONDS; computed
+    live only until the first snapshot exists.
+    """
     if admin_code != config.ADMIN_CODE:
         raise HTTPException(status_code=401, detail="Invalid admin code")
     
-    stats = crud.get_upload_stats(db)
-    
-    # Get professor details
-    professors = crud.get_all_professors(db)
-    prof_stats = []
-    for prof in professors:
-        p_stats = crud.get_professor_stats(db, prof.id)
-        prof_stats.append({
-            "id": prof.id,
-            "name": prof.name,
-            "uploads": p_stats["total_uploads"],
-            "linked": prof.telegram_id is not None
-        })
-    
-    stats["professors"] = prof_stats
+    stats = getattr(app.state, "stats_cache", None)
+    if stats is None:
+        stats = compute_admin_stats(db)
     
     return stats
 
 
 @app.get("/jobs/{job_id}")
-async def get_job_status_endpoint(job_id: int):
+def get_job_status_endpoint(job_id: int):
     """Get background job status."""
     status = get_job_status(job_id)
     if not status:
@@ -286,15 +332,23 @@ async def health():
     return {"status": "healthy"}
 
 
+def process_telegram_update(update):
+    """Run bot handlers for one update (called after the webhook has responded)."""
+    from app.bot import bot
+    
+    try:
+        bot.process_new_updates([update])
+    except Exception as e:
+        print(f"❌ Error processing update: {e}")
+        traceback.print_exc()
+
+
 @app.post("/webhook/{token}")
-async def webhook(token: str, request: Request):
+async def webhook(token: str, request: Request, background_tasks: BackgroundTasks):
     """Handle Telegram webhook updates."""
     if token != config.TELEGRAM_TOKEN:
         raise HTTPException(status_code=403, detail="Invalid token")
     
-    from app.bot import bot
-    import traceback
-    
     try:
         json_data = await request.json()
         
@@ -304,9 +358,10 @@ async def webhook(token: str, request: Request):
             print(f"📞 Callback received: {callback_data}")
         
         update = telebot.types.Update.de_json(json_data)
-        bot.process_new_updates([update])
+        # Acknowledge Telegram immediately; handlers run in the threadpool
+        background_tasks.add_task(process_telegram_update, update)
     except Exception as e:
-        print(f"❌ Error processing update: {e}")
+        print(f"❌ Error parsing update: {e}")
         traceback.print_exc()
         # Still return OK to Telegram so it doesn't retry
     
@@ -5,9 +5,11 @@ SQLAlchemy database models for CourseMateBot.
 from datetime import datetime
 from sqlalchemy import (
     Column, Integer, String, Boolean, DateTime, ForeignKey, 
-    Text, UniqueConstraint, Index
+    Text, UniqueConstraint, Index, text
 )
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from app.database import Base
 
 
@@ -17,7 +19,7 @@ class Admin(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(String, unique=True, nullable=False, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
 
 
 class University(Base):
@@ -26,7 +28,7 @@ class University(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     
     # Relationships
     majors = relationship("Major", back_populates="university")
@@ -40,7 +42,7 @@ class Major(Base):
     id = Column(Integer, primary_key=True, index=True)
     university_id = Column(Integer, ForeignKey("universities.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     
     # Relationships
     university = relationship("University", back_populates="majors")
@@ -61,7 +63,7 @@ class Professor(Base):
     code = Column(String, unique=True, nullable=False, index=True)
     course_id = Column(Integer, ForeignKey("courses.id"), nullable=True, index=True)
     active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     
     # Relationships
     course = relationship("Course", back_populates="professors")
@@ -81,7 +83,7 @@ class Student(Base):
     db_major_id = Column(Integer, ForeignKey("majors.id"), nullable=False, index=True)
     year = Column(String, nullable=False)
     verified = Column(Boolean, default=False, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     verified_at = Column(DateTime, nullable=True)
     
     # Relationships
@@ -91,6 +93,11 @@ class Student(Base):
     
     __table_args__ = (
         Index('idx_student_verification', 'university_id', 'verified'),
+        # Covers the cohort lookup used for quiz notifications (telegram_id included)
+        Index('idx_student_cohort', 'db_university_id', 'db_major_id', 'year', 'verified', 'telegram_id'),
+        # Partial index over the (small) pending-approval queue only
+        Index('idx_students_pending', 'created_at',
+              postgresql_where=text('verified = false'), sqlite_where=text('verified = 0')),
     )
 
 
@@ -127,12 +134,16 @@ class Material(Base):
     filepath = Column(String, nullable=False)
     week = Column(String, nullable=False, index=True)
     description = Column(Text, nullable=True)
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    uploaded_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     
     # Relationships
-    course = relationship("Course", back_populates="materials")
-    uploader = relationship("Professor", back_populates="materials")
+    course = relationship("Course", back_populates="materials", lazy="joined")
+    uploader = relationship("Professor", back_populates="materials", lazy="joined")
     quizzes = relationship("Quiz", back_populates="material")
+    
+    __table_args__ = (
+        Index('idx_material_course_week', 'course_id', 'week'),
+    )
 
 
 class Quiz(Base):
@@ -146,12 +157,17 @@ class Quiz(Base):
     week = Column(String, nullable=True, index=True)  # New: week number
     difficulty = Column(String, nullable=False)
     data_json = Column(Text, nullable=False)  # JSON string of quiz questions
-    generated_at = Column(DateTime, default=datetime.utcnow)
+    generated_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
     
     # Relationships
-    material = relationship("Material", back_populates="quizzes")
-    course = relationship("Course", back_populates="quizzes")
-    student = relationship("Student", back_populates="quizzes")
+    material = relationship("Material", back_populates="quizzes", lazy="joined")
+    course = relationship("Course", back_populates="quizzes", lazy="joined")
+    student = relationship("Student", back_populates="quizzes", lazy="joined")
+    
+    __table_args__ = (
+        Index('idx_quiz_material_difficulty', 'material_id', 'difficulty'),
+        Index('idx_quiz_course_student_week', 'course_id', 'student_id', 'week'),
+    )
 
 
 class RateLimit(Base):
@@ -183,7 +199,37 @@ class BackgroundJob(Base):
     course_id = Column(Integer, nullable=True, index=True)  # New: for quiz generation
     student_id = Column(Integer, nullable=True, index=True)  # New: for quiz generation
     professor_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now(), nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+    
+    # Bulky result/error text lives in a side table so status polls stay small
+    payload = relationship("BackgroundJobPayload", back_populates="job", uselist=False,
+                           cascade="all, delete-orphan")
+    error_message = association_proxy("payload", "error_message",
+                                      creator=lambda value: BackgroundJobPayload(error_message=value))
+    result_data = association_proxy("payload", "result_data",
+                                    creator=lambda value: BackgroundJobPayload(result_data=value))
+    
+    __table_args__ = (
+        Index('idx_job_status_type', 'status', 'job_type'),
+    )
+
+
+class BackgroundJobPayload(Base):
+    """Result and error text of a background job."""
+    __tablename__ = "background_job_payloads"
+    
+    job_id = Column(Integer, ForeignKey("background_jobs.id"), primary_key=True)
     error_message = Column(Text, nullable=True)
     result_data = Column(Text, nullable=True)  # JSON result
-    created_at = Column(DateTime, default=datetime.utcnow)
-    completed_at = Column(DateTime, nullable=True)
+    
+    # Relationships
+    job = relationship("BackgroundJob", back_populates="payload")
+
+
+class StatsCounter(Base):
+    """Running row counts backing the admin statistics."""
+    __tablename__ = "stats_counters"
+    
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -2,11 +2,18 @@
 File storage utilities for managing uploaded materials.
 """
 
+import io
 import os
+import re
+import shutil
 from pathlib import Path
-from typing import Tuple
+from typing import BinaryIO, Tuple
 from app.config import config
 
+# Path separators and spaces become underscores in stored paths
+_PATH_TRANS = str.maketrans({'/': '_', '\\': '_', ' ': '_'})
+_DOTDOT = re.compile(r'\.\.')
+
 
 def get_storage_path(university: str, major: str, course: str, week: str, filename: str) -> Tuple[Path, str]:
     """
@@ -42,40 +49,72 @@ def save_uploaded_file(file_content: bytes, filepath: Path) -> bool:
         file_content: Binary file content
         filepath: Full path where to save
         
+    Returns:
+        True if successful, False otherwise
+    """
+    return save_uploaded_stream(io.BytesIO(file_content), filepath)
+
+
+def save_uploaded_stream(src: BinaryIO, filepath: Path, buf_size: int = 1 << 20) -> bool:
+    """
+    Stream a file-like object to disk in fixed-size chunks.
+    
+    Args:
+        src: Readable binary file object
+        filepath: Full path where to save
+        buf_size: Chunk size in bytes
+        
     Returns:
         True if successful, False otherwise
     """
     try:
         ensure_directory(filepath)
-        with open(filepath, 'wb') as f:
-            f.write(file_content)
+        with open(filepath, 'wb', buffering=buf_size) as f:
+            shutil.copyfileobj(src, f, buf_size)
+            f.flush()
+            # Pages must be written back before the kernel will drop them
+            os.fsync(f.fileno())
+            _drop_page_cache(f.fileno())
         return True
     except Exception as e:
         print(f"Error saving file: {e}")
         return False
 
 
+def _drop_page_cache(fd: int) -> None:
+    """Hint the kernel to evict a written file; materials are rarely re-read soon."""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+
+
 def sanitize_path_component(component: str) -> str:
     """Sanitize path component to prevent directory traversal."""
-    # Remove any path separators and special characters
-    component = component.replace('/', '_').replace('\\', '_')
-    component = component.replace('..', '_')
-    # Remove leading/trailing spaces
-    component = component.strip()
-    # Replace spaces with underscores
-    component = component.replace(' ', '_')
-    return component
+    # Strip, map separators and spaces to underscores, then neutralise '..'
+    return _DOTDOT.sub('_', component.strip().translate(_PATH_TRANS))
 
 
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename to be filesystem-safe."""
-    # Keep extension
-    name, ext = os.path.splitext(filename)
+    # Keep extension (a final suffix that contains no path separator)
+    dot = filename.rfind('.')
+    if dot > 0 and '/' not in filename[dot:] and '\\' not in filename[dot:]:
+        name, ext = filename[:dot], filename[dot:]
+    else:
+        name, ext = filename, ''
     name = sanitize_path_component(name)
-    # Limit length
-    if len(name) > 200:
-        name = name[:200]
-    return f"{name}{ext}"
+    ext = sanitize_path_component(ext)
+    # Limit length in bytes, since filesystems cap names at 255 bytes
+    encoded = name.encode()
+    if len(encoded) > 200:
+        name = encoded[:200].decode(errors='ignore')
+    filename = f"{name}{ext}"
+    # Never return a name that refers to the directory itself or its parent
+    if filename in ('', '.', '..'):
+        return '_'
+    return filename
 
 
 def get_file_path(relative_path: str) -> Path:
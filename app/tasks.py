@@ -2,20 +2,22 @@
 Background task queue for handling async jobs like quiz generation.
 """
 
-import json
+import os
 import threading
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from pathlib import Path
 from app.database import SessionLocal
 from app import crud
-from app.utils import extract_text_from_file, truncate_text_smart
+from app.jsonutil import dumps_json, loads_json
+from app.utils import extract_text_from_files, truncate_text_smart
 from app.ai_provider import get_ai_provider
 from app.config import config
 
 
-# Thread pool for background tasks
-executor = ThreadPoolExecutor(max_workers=3)
+# Thread pool for background tasks. Quiz jobs mostly wait on file I/O and the
+# AI API, so run several per core; the DB pool (20 + 40 overflow) covers it.
+executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4))
 
 
 def notify_quiz_ready(db, material, quiz, difficulty):
@@ -119,49 +121,57 @@ def process_quiz_generation(job_id: int, course_id: int, week: str, student_id:
         difficulty: Quiz difficulty level
         n_questions: Number of questions to generate
     """
-    db = SessionLocal()
-    
     try:
-        # Update job status
-        crud.update_job_status(db, job_id, 'running')
-        
-        # Get all materials for this course/week
-        materials = crud.get_materials_by_course(db, course_id, week=week)
+        # Mark running and load materials, then give the connection back to
+        # the pool for the slow extraction and AI call
+        with SessionLocal() as db:
+            crud.update_job_status(db, job_id, 'running')
+            materials = crud.get_materials_by_course(db, course_id, week=week)
         if not materials:
             raise ValueError(f"No materials found for course {course_id}, week {week}")
         
         # Extract and combine text from ALL materials
-        combined_text = ""
+        parts = []
+        total_chars = 0
         material_count = 0
         
         MIN_FILE_CHARS = 20   # accept very short text per file
         MIN_TOTAL_CHARS = 50  # allow tiny combined content
+        MAX_TOTAL_CHARS = 12000  # prompt budget; later text would be truncated away
         
+        # Extract in material order, a file or two ahead, until the budget is full
+        filepaths = []
         for material in materials:
-            try:
-                filepath = Path(material.filepath)
-                if not filepath.is_absolute():
-                    filepath = config.STORAGE_ROOT / filepath
-                
-                text = extract_text_from_file(filepath)
-                if text and len(text.strip()) >= MIN_FILE_CHARS:
-                    combined_text += f"\n\n=== From {material.filename} ===\n\n{text}"
-                    material_count += 1
-                else:
-                    # Use description and filename as fallback context
-                    fallback_bits = []
-                    if material.description:
-                        fallback_bits.append(material.description)
-                    fallback_bits.append(f"Title: {material.filename}")
-                    combined_text += f"\n\n=== From {material.filename} (fallback) ===\n\n" + "\n".join(fallback_bits)
-            except Exception as e:
-                print(f"⚠️ Failed to extract text from {material.filename}: {e}")
+            filepath = Path(material.filepath)
+            if not filepath.is_absolute():
+                filepath = config.STORAGE_ROOT / filepath
+            filepaths.append(filepath)
+        texts = extract_text_from_files(filepaths)
+        
+        for material, text in zip(materials, texts):
+            if text and len(text.strip()) >= MIN_FILE_CHARS:
+                part = f"\n\n=== From {material.filename} ===\n\n{text}"
+                material_count += 1
+            else:
+                # Use description and filename as fallback context
+                fallback_bits = []
+                if material.description:
+                    fallback_bits.append(material.description)
+                fallback_bits.append(f"Title: {material.filename}")
+                part = f"\n\n=== From {material.filename} (fallback) ===\n\n" + "\n".join(fallback_bits)
+            parts.append(part)
+            total_chars += len(part)
+            if total_chars > MAX_TOTAL_CHARS:
+                break
+        texts.close()  # cancel extraction of materials past the budget
+        
+        combined_text = "".join(parts)
         
         if not combined_text or len(combined_text.strip()) < MIN_TOTAL_CHARS:
             raise ValueError("Could not extract sufficient text from materials (need more content in files or descriptions)")
         
         # Truncate text if too long
-        combined_text = truncate_text_smart(combined_text, max_length=12000)
+        combined_text = truncate_text_smart(combined_text, max_length=MAX_TOTAL_CHARS)
         
         # Generate quiz using AI with randomization seed based on student ID for uniqueness
         ai_provider = get_ai_provider()
@@ -171,34 +181,33 @@ def process_quiz_generation(job_id: int, course_id: int, week: str, student_id:
             raise ValueError("AI provider returned no questions")
         
         # Save quiz to database (linked to student for personalization)
-        quiz_data = json.dumps(questions)
-        quiz = crud.create_quiz(
-            db,
-            course_id=course_id,
-            difficulty=difficulty,
-            data_json=quiz_data,
-            material_id=None,  # Not linked to a single material
-            student_id=student_id,  # Personal quiz for this student
-            week=week
-        )
-        
-        # Update job status
-        result_data = json.dumps({
-            "quiz_id": quiz.id, 
-            "num_questions": len(questions),
-            "material_count": material_count
-        })
-        crud.update_job_status(db, job_id, 'completed', result_data=result_data)
+        quiz_data = dumps_json(questions)
+        with SessionLocal() as db:
+            quiz = crud.create_quiz(
+                db,
+                course_id=course_id,
+                difficulty=difficulty,
+                data_json=quiz_data,
+                material_id=None,  # Not linked to a single material
+                student_id=student_id,  # Personal quiz for this student
+                week=week
+            )
+            
+            # Update job status
+            result_data = dumps_json({
+                "quiz_id": quiz.id, 
+                "num_questions": len(questions),
+                "material_count": material_count
+            })
+            crud.update_job_status(db, job_id, 'completed', result_data=result_data)
         
         print(f"✅ Quiz generated successfully for student {student_id}, course {course_id}, week {week} from {material_count} materials")
         
     except Exception as e:
         error_msg = str(e)
         print(f"❌ Quiz generation failed: {error_msg}")
-        crud.update_job_status(db, job_id, 'failed', error_message=error_msg)
-    
-    finally:
-        db.close()
+        with SessionLocal() as db:
+            crud.update_job_status(db, job_id, 'failed', error_message=error_msg)
 
 
 def submit_quiz_generation_task(course_id: int, week: str, student_id: int,
@@ -219,9 +228,7 @@ def submit_quiz_generation_task(course_id: int, week: str, student_id: int,
     Returns:
         Job ID
     """
-    db = SessionLocal()
-    
-    try:
+    with SessionLocal() as db:
         if n_questions is None:
             n_questions = config.QUIZ_QUESTIONS_DEFAULT
         
@@ -239,9 +246,6 @@ def submit_quiz_generation_task(course_id: int, week: str, student_id: int,
         
         print(f"📝 Submitted quiz generation job {job.id} for student {student_id}, course {course_id}, week {week}")
         return job.id
-        
-    finally:
-        db.close()
 
 
 def get_job_status(job_id: int) -> Optional[dict]:
@@ -254,9 +258,7 @@ def get_job_status(job_id: int) -> Optional[dict]:
     Returns:
         Job status dict or None
     """
-    db = SessionLocal()
-    
-    try:
+    with SessionLocal() as db:
         job = crud.get_job_by_id(db, job_id)
         if not job:
             return None
@@ -268,19 +270,18 @@ def get_job_status(job_id: int) -> Optional[dict]:
             "created_at": job.created_at.isoformat(),
         }
         
-        if job.error_message:
-            result["error"] = job.error_message
-        
-        if job.result_data:
-            try:
-                result["result"] = json.loads(job.result_data)
-            except:
-                result["result"] = job.result_data
+        # Only finished jobs have a payload; skip the second query while polling
+        if job.status in ('completed', 'failed'):
+            if job.error_message:
+                result["error"] = job.error_message
+            
+            if job.result_data:
+                try:
+                    result["result"] = loads_json(job.result_data)
+                except:
+                    result["result"] = job.result_data
         
         if job.completed_at:
             result["completed_at"] = job.completed_at.isoformat()
         
         return result
-        
-    finally:
-        db.close()
@@ -0,0 +1,60 @@
+"""Shared pytest fixtures."""
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.database import IS_SQLITE, Base, engine
+
+
+if IS_SQLITE:
+    # pysqlite defers BEGIN and mishandles SAVEPOINT; let SQLAlchemy drive
+    # transactions so the rollback-per-test fixture below really isolates tests
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_conn, connection_record):
+        dbapi_conn.isolation_level = None
+    
+    @event.listens_for(engine, "begin")
+    def _emit_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    """Create the schema once for the whole test run."""
+    engine.dispose()  # drop connections opened before the listeners above
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def db():
+    """
+    Session whose work is rolled back after each test.
+    
+    Commits inside the code under test only release a SAVEPOINT; the outer
+    transaction is discarded on teardown, so no per-test DDL is needed.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, autoflush=False, expire_on_commit=False,
+                      join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture
+def count_queries(db):
+    """Record every SQL statement sent to the database during the test."""
+    queries = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Savepoint bookkeeping from the db fixture is not part of the query count
+        if not statement.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")):
+            queries.append(statement)
+    
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield queries
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
@@ -3,17 +3,6 @@
 import pytest
 from unittest.mock import Mock, patch
 from app import crud
-from app.database import Base, engine, SessionLocal
-
-
-@pytest.fixture
-def db():
-    """Create test database session."""
-    Base.metadata.create_all(bind=engine)
-    session = SessionLocal()
-    yield session
-    session.close()
-    Base.metadata.drop_all(bind=engine)
 
 
 def test_student_verification_flow(db):
@@ -1,20 +1,10 @@
 """Tests for CRUD operations."""
 
 import pytest
-from app.database import Base, engine, SessionLocal
+from sqlalchemy.exc import InvalidRequestError
 from app import crud, models
 
 
-@pytest.fixture
-def db():
-    """Create test database session."""
-    Base.metadata.create_all(bind=engine)
-    session = SessionLocal()
-    yield session
-    session.close()
-    Base.metadata.drop_all(bind=engine)
-
-
 def test_create_and_get_professor(db):
     """Test professor creation and retrieval."""
     prof = crud.create_professor(db, "Dr. Smith", "PROF001")
@@ -82,7 +72,7 @@ def test_rate_limiting(db):
     assert crud.check_rate_limit(db, prof.id, "upload", 3) is False
 
 
-def test_get_materials_by_course(db):
+def test_get_materials_by_course(db, count_queries):
     """Test getting materials by course."""
     prof = crud.create_professor(db, "Dr. Smith", "PROF001")
     course = crud.get_or_create_course(db, "Tech U", "CS", "1", "Intro")
@@ -98,8 +88,10 @@ def test_get_materials_by_course(db):
             week="1"
         )
     
+    count_queries.clear()
     materials = crud.get_materials_by_course(db, course.id, week="1")
     assert len(materials) == 3
+    assert len(count_queries) <= 2
 
 
 def test_pending_students(db):
@@ -140,3 +132,140 @@ def test_upload_stats(db):
     assert stats["total_courses"] == 1
     assert stats["total_professors"] == 1
     assert stats["total_verified_students"] == 1
+
+
+def test_professor_upload_counts(db):
+    """Test per-professor upload counts aggregation."""
+    prof1 = crud.create_professor(db, "Dr. Smith", "PROF001")
+    prof2 = crud.create_professor(db, "Dr. Jones", "PROF002")
+    crud.create_professor(db, "Dr. Idle", "PROF003")
+    course = crud.get_or_create_course(db, "Tech U", "CS", "1", "Intro")
+    
+    for i in range(2):
+        crud.create_material(db, course.id, prof1.id, f"a{i}.pdf", f"path/a{i}.pdf", "1")
+    crud.create_material(db, course.id, prof2.id, "b.pdf", "path/b.pdf", "1")
+    
+    counts = crud.get_professor_upload_counts(db)
+    
+    assert counts == {prof1.id: 2, prof2.id: 1}
+
+
+def test_bulk_create_students(db):
+    """Test bulk student insertion."""
+    rows = [
+        {
+            "university_id": f"U{i:06d}",
+            "db_university_id": 1,
+            "db_major_id": 1,
+            "year": "1",
+            "verified": False
+        }
+        for i in range(5)
+    ]
+    
+    inserted = crud.bulk_create_students(db, rows)
+    
+    assert inserted == 5
+    assert len(crud.get_pending_students(db)) == 5
+    assert crud.get_student_by_university_id(db, "U000003") is not None
+
+
+def test_stats_counters_follow_writes(db):
+    """Test stats counters track creates and course deletion."""
+    university = crud.create_university(db, "Tech U")
+    major = crud.create_major(db, university.id, "CS")
+    prof = crud.create_professor(db, "Dr. Smith", "PROF001")
+    course = crud.create_course(db, university.id, major.id, "1", "Intro")
+    crud.create_material(db, course.id, prof.id, "test.pdf", "path/test.pdf", "1")
+    student = crud.create_student(db, "U123456", university.id, major.id, "1")
+    crud.verify_student(db, student.id, "12345")
+    
+    stats = crud.get_upload_stats(db)
+    assert stats["total_uploads"] == 1
+    assert stats["total_courses"] == 1
+    assert stats["total_verified_students"] == 1
+    
+    crud.delete_course(db, course.id)
+    
+    stats = crud.get_upload_stats(db)
+    assert stats["total_uploads"] == 0
+    assert stats["total_courses"] == 0
+    assert stats["total_professors"] == 1
+
+
+def test_refresh_stats_counters_overwrites_drift(db):
+    """Test a recount replaces stale counter values in place."""
+    university = crud.create_university(db, "Tech U")
+    crud.create_major(db, university.id, "CS")
+    db.execute(models.StatsCounter.__table__.update().values(value=99))
+    db.commit()
+    
+    crud.refresh_stats_counters(db, models.Major)
+    stats = crud.get_upload_stats(db)
+    assert stats["total_majors"] == 1
+    assert stats["total_universities"] == 99
+    
+    crud.refresh_stats_counters(db)
+    assert crud.get_upload_stats(db)["total_universities"] == 1
+
+
+def test_materials_by_course_single_query(db, count_queries):
+    """Test materials listing runs one query and blocks lazy loads."""
+    university = crud.create_university(db, "Tech U")
+    major = crud.create_major(db, university.id, "CS")
+    prof = crud.create_professor(db, "Dr. Smith", "PROF001")
+    course = crud.create_course(db, university.id, major.id, "1", "Intro")
+    for i in range(3):
+        crud.create_material(db, course.id, prof.id, f"lecture{i}.pdf", f"path/lecture{i}.pdf", "1")
+    db.expunge_all()
+    
+    count_queries.clear()
+    materials = crud.get_materials_by_course(db, course.id)
+    
+    assert len(materials) == 3
+    assert len(count_queries) == 1
+    with pytest.raises(InvalidRequestError):
+        materials[0].quizzes
+    
+    db.expunge_all()
+    count_queries.clear()
+    materials = crud.get_materials_by_course(db, course.id, eager=True)
+    
+    assert materials[0].course.university.name == "Tech U"
+    assert materials[0].course.major.name == "CS"
+    assert len(count_queries) == 1
+
+
+@pytest.mark.parametrize("upsert", [True, False])
+def test_bulk_create_missing(db, monkeypatch, upsert):
+    """Test insert-if-missing skips rows that hit a unique key."""
+    if not upsert:
+        monkeypatch.setattr(crud, "_upsert_insert", lambda db: None)
+    crud.create_university(db, "Tech U")
+    
+    inserted = crud.bulk_create_missing(db, models.University, [
+        {"name": "Tech U"}, {"name": "Other U"}
+    ], ["name"])
+    
+    assert inserted == 1
+    assert crud.get_university_by_name(db, "Other U") is not None
+    assert crud.get_upload_stats(db)["total_universities"] == 2
+
+
+def test_catalog_version_bumps_only_on_commit(db):
+    """Test listing cache invalidation waits for the write to commit."""
+    version = crud._catalog_version
+    
+    crud.create_university(db, "Pending U", commit=False)
+    assert crud._catalog_version == version
+    db.rollback()
+    db.commit()
+    assert crud._catalog_version == version
+    
+    university = crud.create_university(db, "Tech U", commit=False)
+    crud.create_major(db, university.id, "CS", commit=False)
+    assert crud._catalog_version == version
+    db.commit()
+    
+    assert crud._catalog_version == version + 1
+    assert [u.name for u in crud.get_all_universities(db)] == ["Tech U"]
@@ -2,20 +2,9 @@
 
 import pytest
 from datetime import datetime
-from app.database import Base, engine, SessionLocal
 from app.models import Admin, Professor, Student, Course, Material, Quiz
 
 
-@pytest.fixture
-def db():
-    """Create test database session."""
-    Base.metadata.create_all(bind=engine)
-    session = SessionLocal()
-    yield session
-    session.close()
-    Base.metadata.drop_all(bind=engine)
-
-
 def test_create_admin(db):
     """Test admin creation."""
     admin = Admin(telegram_id="123456789")
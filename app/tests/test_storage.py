@@ -0,0 +1,25 @@
+"""Tests for storage path helpers."""
+
+import pytest
+from app.config import config
+from app.storage import get_storage_path, sanitize_filename
+
+
+@pytest.mark.parametrize("filename", ["..", ".", ""])
+def test_sanitize_filename_rejects_dot_names(filename):
+    """Test names that would point at a directory are replaced."""
+    assert sanitize_filename(filename) == "_"
+
+
+def test_sanitize_filename_keeps_extension():
+    """Test stem and extension are sanitized without losing the extension."""
+    assert sanitize_filename("week 1/notes.pdf") == "week_1_notes.pdf"
+    assert sanitize_filename("notes.p df") == "notes.p_df"
+
+
+def test_storage_path_stays_in_week_directory():
+    """Test a '..' upload name cannot escape the week directory."""
+    full_path, _ = get_storage_path("U", "M", "C", "1", "..")
+    
+    assert full_path.parent == config.STORAGE_ROOT / "U" / "M" / "C" / "1"
+    assert full_path.name == "_"
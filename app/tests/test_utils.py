@@ -0,0 +1,114 @@
+"""Tests for text extraction helpers."""
+
+import pytest
+from docx import Document
+from docx.enum.text import WD_BREAK
+from docx.shared import Inches
+from pptx import Presentation
+from app import utils
+from app.utils import extract_text_from_docx, extract_text_from_files, extract_text_from_pptx
+
+
+def test_docx_keeps_tabs_and_line_breaks(tmp_path):
+    """Test DOCX extraction renders tabs and breaks like python-docx does."""
+    doc = Document()
+    paragraph = doc.add_paragraph()
+    paragraph.paragraph_format.tab_stops.add_tab_stop(Inches(1))  # a w:tab outside any run
+    run = paragraph.add_run("run")
+    run.add_tab()
+    run.add_text("Tab")
+    run.add_break()
+    run.add_text("next line")
+    run.add_break(WD_BREAK.PAGE)
+    run.add_text("after page")
+    doc.add_paragraph("second")
+    path = tmp_path / "breaks.docx"
+    doc.save(path)
+    
+    text = extract_text_from_docx(path)
+    
+    assert text == "run\tTab\nnext lineafter page\nsecond"
+    assert text == "\n".join(p.text for p in Document(path).paragraphs)
+
+
+def test_pptx_keeps_line_breaks(tmp_path):
+    """Test PPTX extraction turns a:br line breaks into newlines."""
+    prs = Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[1])
+    slide.shapes.title.text = "Title"
+    body = slide.placeholders[1].text_frame
+    body.text = "Hello\vWorld"  # python-pptx writes \v as <a:br/>
+    body.add_paragraph().text = "next"
+    path = tmp_path / "breaks.pptx"
+    prs.save(path)
+    
+    assert extract_text_from_pptx(path) == "Title\nHello\nWorld\nnext"
+
+
+def test_extract_text_from_files_keeps_order(tmp_path, monkeypatch):
+    """Test batch extraction returns one result per path, in input order."""
+    monkeypatch.setattr(utils, "config", utils.config._replace(
+        EXTRACT_CACHE_DIR=tmp_path / "cache", EXTRACT_TIMEOUT_SECONDS=0
+    ))
+    paths = []
+    for name in ("first", "second", "third"):
+        doc = Document()
+        doc.add_paragraph(f"{name} lecture")
+        doc.save(tmp_path / f"{name}.docx")
+        paths.append(tmp_path / f"{name}.docx")
+    paths.insert(1, tmp_path / "notes.txt")
+    
+    texts = list(extract_text_from_files(paths))
+    
+    assert texts == ["first lecture", None, "second lecture", "third lecture"]
+
+
+def test_extract_text_from_files_stops_with_consumer(tmp_path, monkeypatch):
+    """Test files past the lookahead window are not parsed once iteration stops."""
+    parsed = []
+    monkeypatch.setattr(utils, "_extract_or_none", lambda path: parsed.append(path) or path.name)
+    paths = [tmp_path / f"week{i}.pdf" for i in range(10)]
+    
+    texts = extract_text_from_files(paths, lookahead=2)
+    first = next(texts)
+    texts.close()
+    
+    assert first == "week0.pdf"
+    assert len(parsed) <= 3
+
+
+def test_timed_out_extraction_is_retried(tmp_path, monkeypatch):
+    """Test a timeout is not cached, so the next call parses the file again."""
+    monkeypatch.setattr(utils, "config", utils.config._replace(EXTRACT_CACHE_DIR=tmp_path / "cache"))
+    results = [None, "recovered"]  # timeout, then a successful parse
+    monkeypatch.setattr(utils, "_extract_with_timeout", lambda extractor, path: results.pop(0))
+    path = tmp_path / "slow.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    
+    assert utils.extract_text_from_file(path) == ""
+    assert utils.extract_text_from_file(path) == "recovered"
+    assert utils.extract_text_from_file(path) == "recovered"  # now served from the cache
+
+
+def test_pdf_layout_fallback_skips_oversized_pages(tmp_path, monkeypatch):
+    """Test the pdfplumber fallback is told which pages the fast pass skipped as too large."""
+    fitz = pytest.importorskip("fitz")
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "ok")
+    drawing = doc.new_page()
+    for y in range(0, 800, 2):
+        drawing.draw_line((0, y), (600, y))
+    drawing.insert_text((72, 72), "hidden in the drawing")
+    path = tmp_path / "drawing.pdf"
+    doc.save(path)
+    monkeypatch.setattr(utils, "MAX_PDF_CONTENT_BYTES", 2000)
+    real_module = utils._optional_module
+    monkeypatch.setattr(utils, "_optional_module", lambda name: name == "pdfplumber" or real_module(name))
+    layout_calls = []
+    monkeypatch.setattr(utils, "extract_text_from_pdf_layout",
+                        lambda path, skip_pages=(): layout_calls.append(list(skip_pages)) or "")
+    
+    text = utils.extract_text_from_pdf(path)
+    
+    assert text.strip() == "ok"
+    assert layout_calls == [[1]]
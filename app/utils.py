@@ -2,97 +2,316 @@
 Text extraction utilities from PDF, DOCX, and PPTX files.
 """
 
+import hashlib
+import importlib
+import io
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Optional
-import PyPDF2
-from docx import Document
-from pptx import Presentation
+from typing import Any, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+from app.config import config
+
+# Parser libraries (PyMuPDF, PyPDF2, pdfplumber, python-docx, python-pptx) are
+# imported inside the extractors so importing this module stays cheap.
 
 
 MAX_TEXT_LENGTH = 50000  # Maximum characters to extract
+PDF_MIN_CHARS_PER_PAGE = 50  # Below this, retry the PDF with layout analysis
+MAX_PDF_CONTENT_BYTES = 2_000_000  # Skip pages whose drawing commands exceed this
+PDF_IN_MEMORY_MAX_BYTES = 50 * 1024 * 1024  # PyPDF2 reads smaller files from memory
+MAX_EXTRACT_WORKERS = os.cpu_count() or 1  # Extraction processes alive at once, busy or idle
+EXTRACT_LOOKAHEAD = 2  # Files extract_text_from_files parses ahead of its consumer
+_SENTENCE_ENDS = frozenset('.!?')
+_SENTENCE_GAPS = frozenset(' \n')  # a sentence end must be followed by one of these
+
+
+# Parser libraries, preloaded by extraction worker processes
+_PARSER_MODULES = ('fitz', 'PyPDF2', 'pdfplumber', 'docx', 'pptx')
+
+# Idle extraction worker pools, reused across calls (see _extract_with_timeout).
+# A pool is only started while holding a slot and no idle one exists, so busy
+# plus idle workers never exceed MAX_EXTRACT_WORKERS across all callers.
+_extract_workers: List[Any] = []
+_extract_workers_lock = threading.Lock()
+_extract_slots = threading.BoundedSemaphore(MAX_EXTRACT_WORKERS)
+
+
+@lru_cache(maxsize=None)
+def _optional_module(name: str):
+    """Import an optional parser library on first use; None if not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def _join_capped(parts: List[str], running_len: int) -> str:
+    """
+    Newline-join extracted parts, capped at MAX_TEXT_LENGTH.
+    
+    running_len counts each part plus one separator. Parts past the cap are
+    dropped or trimmed before joining, so the full text is never built only
+    to be sliced.
+    """
+    overflow = running_len - 1 - MAX_TEXT_LENGTH
+    while overflow > 0 and parts:
+        if overflow > len(parts[-1]):
+            overflow -= len(parts.pop()) + 1
+        else:
+            parts[-1] = parts[-1][:len(parts[-1]) - overflow]
+            overflow = 0
+    return '\n'.join(parts)
 
 
 def extract_text_from_pdf(filepath: Path) -> str:
-    """Extract text from PDF file."""
+    """
+    Extract text from PDF file.
+    
+    Uses PyMuPDF when installed (PyPDF2 otherwise) and falls back to
+    pdfplumber's slower layout analysis only when that pass finds little text.
+    """
+    skipped = ()
+    if _optional_module("fitz") is not None:
+        text, pages_read, skipped = _extract_pdf_pymupdf(filepath)
+    else:
+        text, pages_read = _extract_pdf_pypdf2(filepath)
+    
+    if _optional_module("pdfplumber") is not None and pages_read and len(text) / pages_read < PDF_MIN_CHARS_PER_PAGE:
+        print(f"ℹ️ {filepath.name}: {len(text)} chars from {pages_read} page(s), retrying with pdfplumber")
+        layout_text = extract_text_from_pdf_layout(filepath, skip_pages=skipped)
+        if len(layout_text) > len(text):
+            return layout_text
+    
+    return text
+
+
+def _extract_pdf_pymupdf(filepath: Path) -> Tuple[str, int, List[int]]:
+    """Extract PDF text with PyMuPDF; returns (text, pages read, indices of pages skipped)."""
+    import fitz
+    
+    text = []
+    running_len = 0  # chars collected, one separator per part
+    pages_read = 0
+    skipped = []
+    # Plain text only: no image blocks, ligatures expanded to letters
+    flags = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_IMAGES & ~fitz.TEXT_PRESERVE_LIGATURES
+    doc = fitz.open(str(filepath))
     try:
-        text = []
-        with open(filepath, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            num_pages = len(pdf_reader.pages)
+        # Limit pages to prevent excessive processing
+        for page in doc.pages(stop=min(doc.page_count, 50)):
+            # Huge content streams are drawings, not prose; don't parse them
+            stream_size = _pdf_content_size(doc, page)
+            if stream_size > MAX_PDF_CONTENT_BYTES:
+                print(f"⚠️ {filepath.name}: skipping page {page.number + 1} ({stream_size} byte content stream)")
+                skipped.append(page.number)
+                continue
+            
+            pages_read += 1
+            page_text = page.get_text("text", flags=flags)
+            if page_text:
+                text.append(page_text)
+                running_len += len(page_text) + 1
             
-            # Limit pages to prevent excessive processing
-            max_pages = min(num_pages, 50)
+            # Stop if we have enough text
+            if running_len >= MAX_TEXT_LENGTH:
+                break
+    finally:
+        doc.close()
+    
+    return _join_capped(text, running_len), pages_read, skipped
+
+
+def _pdf_content_size(doc, page) -> int:
+    """Get the stored size of a PyMuPDF page's content streams from their /Length keys."""
+    size = 0
+    for xref in page.get_contents():
+        kind, value = doc.xref_get_key(xref, "Length")
+        try:
+            if kind == "xref":  # indirect length, e.g. "5 0 R"
+                value = doc.xref_object(int(value.split()[0]), compressed=True)
+            size += int(value)
+        except ValueError:
+            # Missing or malformed /Length: measure the raw (still encoded) stream
+            size += len(doc.xref_stream_raw(xref) or b"")
+    return size
+
+
+def _open_pdf_stream(filepath: Path) -> BinaryIO:
+    """
+    Open a PDF for PyPDF2, preloading it into memory when small enough.
+    
+    PyPDF2 does many tiny reads (byte-by-byte on inline images), which are
+    far cheaper on a BytesIO than through a file object; large files get a
+    big read buffer instead so memory stays bounded.
+    """
+    if filepath.stat().st_size <= PDF_IN_MEMORY_MAX_BYTES:
+        return io.BytesIO(filepath.read_bytes())
+    return open(filepath, 'rb', buffering=1 << 20)
+
+
+def _extract_pdf_pypdf2(filepath: Path) -> Tuple[str, int]:
+    """Extract PDF text with the pure-Python PyPDF2 reader; returns (text, pages read)."""
+    import PyPDF2
+    
+    text = []
+    running_len = 0  # chars collected, one separator per part
+    pages_read = 0
+    with _open_pdf_stream(filepath) as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        
+        # Limit pages to prevent excessive processing
+        for page in islice(pdf_reader.pages, 50):
+            pages_read += 1
+            page_text = page.extract_text()
+            if page_text:
+                text.append(page_text)
+                running_len += len(page_text) + 1
             
-            for page_num in range(max_pages):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
+            # Stop if we have enough text
+            if running_len >= MAX_TEXT_LENGTH:
+                break
+    
+    return _join_capped(text, running_len), pages_read
+
+
+def extract_text_from_pdf_layout(filepath: Path, skip_pages: Iterable[int] = ()) -> str:
+    """
+    Extract PDF text with pdfplumber's layout analysis (multi-column, tables).
+    
+    skip_pages holds 0-based indices of pages to leave out, e.g. those the
+    fast pass found too large to parse.
+    """
+    import pdfplumber
+    
+    skip_pages = frozenset(skip_pages)
+    try:
+        text = []
+        running_len = 0  # chars collected, one separator per part
+        with pdfplumber.open(filepath) as pdf:
+            # Same page cap as the fast extractors
+            for number, page in enumerate(pdf.pages[:50]):
+                if number in skip_pages:
+                    continue
+                page_text = page.extract_text(x_tolerance=2, y_tolerance=2)
                 if page_text:
                     text.append(page_text)
+                    running_len += len(page_text) + 1
                 
                 # Stop if we have enough text
-                current_length = len(''.join(text))
-                if current_length >= MAX_TEXT_LENGTH:
+                if running_len >= MAX_TEXT_LENGTH:
                     break
         
-        full_text = '\n'.join(text)
-        return full_text[:MAX_TEXT_LENGTH]
+        return _join_capped(text, running_len)
     
     except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
+        print(f"Error extracting text from PDF layout: {e}")
         return ""
 
 
 def extract_text_from_docx(filepath: Path) -> str:
     """Extract text from DOCX file."""
-    try:
-        doc = Document(filepath)
-        text = []
-        
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                text.append(paragraph.text)
-            
-            # Stop if we have enough text
-            current_length = len('\n'.join(text))
-            if current_length >= MAX_TEXT_LENGTH:
-                break
+    from docx import Document
+    from docx.oxml.ns import qn
+    
+    doc = Document(filepath)
+    text = []
+    running_len = 0  # chars collected, one separator per part
+    w_p, w_r, w_t, w_br, w_type = qn('w:p'), qn('w:r'), qn('w:t'), qn('w:br'), qn('w:type')
+    # Run-level markup that python-docx renders as characters
+    run_chars = {qn('w:tab'): '\t', qn('w:ptab'): '\t', qn('w:cr'): '\n', qn('w:noBreakHyphen'): '-'}
+    
+    def run_text(run) -> str:
+        chars = []
+        for child in run:
+            if child.tag == w_t:
+                chars.append(child.text or '')
+            elif child.tag == w_br:
+                # Page and column breaks carry no text
+                if child.get(w_type) in (None, 'textWrapping'):
+                    chars.append('\n')
+            else:
+                chars.append(run_chars.get(child.tag, ''))
+        return ''.join(chars)
+    
+    # Walk the body XML directly rather than building Paragraph/Run wrappers
+    for p in doc.element.body.iterchildren(w_p):
+        para_text = ''.join(run_text(run) for run in p.iter(w_r))
+        if para_text.strip():
+            text.append(para_text)
+            running_len += len(para_text) + 1
         
-        full_text = '\n'.join(text)
-        return full_text[:MAX_TEXT_LENGTH]
+        # Stop if we have enough text
+        if running_len >= MAX_TEXT_LENGTH:
+            break
     
-    except Exception as e:
-        print(f"Error extracting text from DOCX: {e}")
-        return ""
+    return _join_capped(text, running_len)
 
 
 def extract_text_from_pptx(filepath: Path) -> str:
     """Extract text from PPTX file."""
-    try:
-        prs = Presentation(filepath)
-        text = []
-        
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    text.append(shape.text)
-            
-            # Stop if we have enough text
-            current_length = len('\n'.join(text))
-            if current_length >= MAX_TEXT_LENGTH:
-                break
+    from pptx import Presentation
+    from pptx.oxml.ns import qn
+    
+    prs = Presentation(filepath)
+    text = []
+    running_len = 0  # chars collected, one separator per part
+    p_sp, p_txbody, a_p, a_t, a_br = qn('p:sp'), qn('p:txBody'), qn('a:p'), qn('a:t'), qn('a:br')
+    runs = {qn('a:r'), qn('a:fld')}  # text-bearing paragraph children
+    
+    def para_text(para) -> str:
+        chars = []
+        for child in para:
+            if child.tag in runs:
+                t = child.find(a_t)
+                if t is not None:
+                    chars.append(t.text or '')
+            elif child.tag == a_br:
+                chars.append('\n')
+        return ''.join(chars)
+    
+    # Walk each slide's shape XML rather than building Shape/TextFrame wrappers
+    for slide in prs.slides:
+        for sp in slide.element.cSld.spTree.iterchildren(p_sp):
+            body = sp.find(p_txbody)
+            if body is None:
+                continue
+            shape_text = '\n'.join(para_text(para) for para in body.iterchildren(a_p))
+            if shape_text.strip():
+                text.append(shape_text)
+                running_len += len(shape_text) + 1
         
-        full_text = '\n'.join(text)
-        return full_text[:MAX_TEXT_LENGTH]
+        # Stop if we have enough text
+        if running_len >= MAX_TEXT_LENGTH:
+            break
     
-    except Exception as e:
-        print(f"Error extracting text from PPTX: {e}")
-        return ""
+    return _join_capped(text, running_len)
+
+
+# File suffix -> extractor
+_EXTRACTORS = {
+    '.pdf': extract_text_from_pdf,
+    '.docx': extract_text_from_docx,
+    '.doc': extract_text_from_docx,
+    '.pptx': extract_text_from_pptx,
+    '.ppt': extract_text_from_pptx,
+}
 
 
 def extract_text_from_file(filepath: Path) -> Optional[str]:
     """
     Extract text from supported file formats.
     
+    Results are cached on disk under a hash of the file contents, so an
+    unchanged material is only parsed once. Files that parse but yield no
+    text (image-only PDFs) are cached as empty entries too; parser errors
+    and timeouts return "" without caching, so they are retried next time.
+    
     Args:
         filepath: Path to file
         
@@ -100,16 +319,138 @@ def extract_text_from_file(filepath: Path) -> Optional[str]:
         Extracted text or None if format not supported
     """
     suffix = filepath.suffix.lower()
-    
-    if suffix == '.pdf':
-        return extract_text_from_pdf(filepath)
-    elif suffix in ['.docx', '.doc']:
-        return extract_text_from_docx(filepath)
-    elif suffix in ['.pptx', '.ppt']:
-        return extract_text_from_pptx(filepath)
-    else:
+    extractor = _EXTRACTORS.get(suffix)
+    if extractor is None:
         print(f"Unsupported file format: {suffix}")
         return None
+    
+    cache_file = _extract_cache_path(filepath, suffix)
+    if cache_file is not None and cache_file.exists():
+        return cache_file.read_text(encoding='utf-8')
+    
+    try:
+        text = _extract_with_timeout(extractor, filepath)
+    except Exception as e:
+        print(f"Error extracting text from {filepath.name}: {e}")
+        return ""
+    if text is None:  # timed out
+        return ""
+    
+    # An empty entry marks content that yields no text, so it isn't re-parsed
+    if cache_file is not None:
+        _store_extracted(cache_file, text)
+    return text
+
+
+def _extract_with_timeout(extractor, filepath: Path) -> Optional[str]:
+    """
+    Run an extractor in a worker process, killing it after EXTRACT_TIMEOUT_SECONDS.
+    
+    Corrupt or adversarial files can keep a parser busy indefinitely; the
+    worker is terminated on timeout and None is returned. Parser errors are
+    re-raised in the caller. Healthy workers are kept for the next call. Like any
+    spawn/forkserver worker they import the entry-point module, which must
+    therefore guard its startup with `if __name__ == "__main__"`.
+    """
+    timeout = config.EXTRACT_TIMEOUT_SECONDS
+    if timeout <= 0:
+        return extractor(filepath)
+    
+    with _extract_slots:
+        pool = _checkout_extract_worker()
+        try:
+            result = pool.apply_async(extractor, (filepath,))
+            try:
+                return result.get(timeout=timeout)
+            except multiprocessing.TimeoutError:
+                pool.terminate()
+                pool = None
+                print(f"❌ Extraction of {filepath.name} timed out after {timeout}s")
+                return None
+        finally:
+            if pool is not None:
+                _release_extract_worker(pool)
+
+
+def _checkout_extract_worker():
+    """Take an idle single-process extraction pool, starting one if none is free."""
+    with _extract_workers_lock:
+        if _extract_workers:
+            return _extract_workers.pop()
+    # Never fork the multi-threaded server: a child can inherit a lock held
+    # by another thread and deadlock. forkserver forks from a clean process.
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method).Pool(1, initializer=_warm_extract_worker)
+
+
+def _release_extract_worker(pool) -> None:
+    """Return a healthy extraction pool for reuse."""
+    with _extract_workers_lock:
+        _extract_workers.append(pool)
+
+
+def _warm_extract_worker() -> None:
+    """Extraction worker initializer: import the parser libraries once, up front."""
+    for name in _PARSER_MODULES:
+        _optional_module(name)
+
+
+def extract_text_from_files(filepaths: List[Path], lookahead: int = EXTRACT_LOOKAHEAD) -> Iterator[Optional[str]]:
+    """
+    Yield extracted text for each file, in order, parsing a few files ahead.
+    
+    At most `lookahead` files are in flight, so a consumer that stops early
+    (e.g. once a prompt budget is full) leaves the rest unparsed; files not
+    yet started are cancelled when the iterator is closed. A file that
+    raises yields None.
+    """
+    with ThreadPoolExecutor(max_workers=lookahead) as pool:
+        paths = iter(filepaths)
+        pending = deque(pool.submit(_extract_or_none, path) for path in islice(paths, lookahead))
+        try:
+            while pending:
+                text = pending.popleft().result()
+                for path in islice(paths, 1):
+                    pending.append(pool.submit(_extract_or_none, path))
+                yield text
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _extract_or_none(filepath: Path) -> Optional[str]:
+    """extract_text_from_file, logging an unexpected error instead of raising."""
+    try:
+        return extract_text_from_file(filepath)
+    except Exception as e:
+        print(f"⚠️ Failed to extract text from {filepath.name}: {e}")
+        return None
+
+
+def file_fingerprint(filepath: Path) -> str:
+    """Get a BLAKE2b digest of a file's contents, streamed through a fixed buffer."""
+    with open(filepath, 'rb') as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+def _extract_cache_path(filepath: Path, suffix: str) -> Optional[Path]:
+    """Get the extraction cache entry for a file, or None if it can't be hashed."""
+    try:
+        return config.EXTRACT_CACHE_DIR / f"{file_fingerprint(filepath)}{suffix}.txt"
+    except OSError as e:
+        print(f"Error hashing {filepath}: {e}")
+        return None
+
+
+def _store_extracted(cache_file: Path, text: str) -> None:
+    """Write a cache entry atomically so concurrent readers never see partial text."""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_file.with_name(f"{cache_file.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(text, encoding='utf-8')
+        tmp.replace(cache_file)
+    except OSError as e:
+        print(f"Error caching extracted text: {e}")
 
 
 def truncate_text_smart(text: str, max_length: int = 10000) -> str:
@@ -126,14 +467,12 @@ def truncate_text_smart(text: str, max_length: int = 10000) -> str:
     if len(text) <= max_length:
         return text
     
-    # Try to find last sentence ending before max_length
+    # Scan back from the end for the last sentence ending, stopping at 80%
+    # of the desired length; usually a hit comes within a few characters
     truncated = text[:max_length]
-    
-    # Look for sentence endings
-    for separator in ['. ', '.\n', '! ', '!\n', '? ', '?\n']:
-        last_idx = truncated.rfind(separator)
-        if last_idx > max_length * 0.8:  # At least 80% of desired length
-            return text[:last_idx + 1]
+    for i in range(len(truncated) - 2, int(max_length * 0.8), -1):
+        if truncated[i] in _SENTENCE_ENDS and truncated[i + 1] in _SENTENCE_GAPS:
+            return text[:i + 1]
     
     # Fallback: just truncate at max_length
     return truncated
@@ -7,10 +7,16 @@ Creates admin, sample professor, course, and student for testing.
 import sys
 import secrets
 from app.database import SessionLocal, init_db
-from app import crud
+from sqlalchemy import select
+from app import crud, models
 from app.config import config
 
 
+def _names_to_ids(db, model, criteria) -> dict:
+    """Map name -> id for the rows of model matching criteria, in one query."""
+    return dict(db.execute(select(model.name, model.id).where(criteria)).all())
+
+
 def seed_database():
     """Seed database with initial data."""
     print("🌱 Seeding database...")
@@ -21,12 +27,13 @@ def seed_database():
     db = SessionLocal()
     
     try:
+        # Each table is seeded with one INSERT ... ON CONFLICT DO NOTHING,
+        # so re-running the script (even concurrently) is safe
+        
         # Create admin if BOT_OWNER_TELEGRAM_ID is set
         if config.BOT_OWNER_TELEGRAM_ID and config.BOT_OWNER_TELEGRAM_ID != 0:
             telegram_id = str(config.BOT_OWNER_TELEGRAM_ID)
-            admin = crud.get_admin_by_telegram_id(db, telegram_id)
-            if not admin:
-                admin = crud.create_admin(db, telegram_id)
+            if crud.bulk_create_missing(db, models.Admin, [{"telegram_id": telegram_id}], ["telegram_id"]):
                 print(f"✅ Created admin with Telegram ID: {telegram_id}")
             else:
                 print(f"ℹ️  Admin already exists: {telegram_id}")
@@ -34,77 +41,58 @@ def seed_database():
             print("⚠️  BOT_OWNER_TELEGRAM_ID not set, skipping admin creation")
         
         # Create sample university
-        university = crud.get_university_by_name(db, "Tech University")
-        if not university:
-            university = crud.create_university(db, "Tech University")
-            print(f"✅ Created university: {university.name}")
+        if crud.bulk_create_missing(db, models.University, [{"name": "Tech University"}], ["name"]):
+            print("✅ Created university: Tech University")
         else:
-            print(f"ℹ️  University '{university.name}' already exists")
+            print("ℹ️  University 'Tech University' already exists")
+        university = crud.get_university_by_name(db, "Tech University")
         
         # Create sample majors
-        cs_major = crud.get_major_by_name(db, university.id, "Computer Science")
-        if not cs_major:
-            cs_major = crud.create_major(db, university.id, "Computer Science")
-            print(f"✅ Created major: Computer Science")
-        else:
-            print(f"ℹ️  Major 'Computer Science' already exists")
-        
-        math_major = crud.get_major_by_name(db, university.id, "Mathematics")
-        if not math_major:
-            math_major = crud.create_major(db, university.id, "Mathematics")
-            print(f"✅ Created major: Mathematics")
-        else:
-            print(f"ℹ️  Major 'Mathematics' already exists")
+        major_names = ["Computer Science", "Mathematics"]
+        created = crud.bulk_create_missing(db, models.Major, [
+            {"university_id": university.id, "name": name} for name in major_names
+        ], ["university_id", "name"])
+        print(f"✅ Majors: {created} created, {len(major_names) - created} already existed")
+        majors = _names_to_ids(db, models.Major, models.Major.university_id == university.id)
+        cs_major_id = majors["Computer Science"]
         
         # Create sample courses
-        course1 = crud.get_or_create_course(
-            db,
-            university_id=university.id,
-            major_id=cs_major.id,
-            year="1",
-            name="Introduction to Programming"
-        )
-        print(f"✅ Created course: {course1.name}")
-        
-        course2 = crud.get_or_create_course(
-            db,
-            university_id=university.id,
-            major_id=cs_major.id,
-            year="1",
-            name="Data Structures and Algorithms"
-        )
-        print(f"✅ Created course: {course2.name}")
-        
-        course3 = crud.get_or_create_course(
-            db,
-            university_id=university.id,
-            major_id=cs_major.id,
-            year="2",
-            name="Database Systems"
-        )
-        print(f"✅ Created course: {course3.name}")
+        course_years = {
+            "Introduction to Programming": "1",
+            "Data Structures and Algorithms": "1",
+            "Database Systems": "2",
+        }
+        created = crud.bulk_create_missing(db, models.Course, [
+            {"university_id": university.id, "major_id": cs_major_id, "year": year, "name": name}
+            for name, year in course_years.items()
+        ], ["university_id", "major_id", "year", "name"])
+        print(f"✅ Courses: {created} created, {len(course_years) - created} already existed")
+        courses = _names_to_ids(db, models.Course, (models.Course.university_id == university.id)
+                                & (models.Course.major_id == cs_major_id))
+        course1_name = "Introduction to Programming"
+        course1_id = courses[course1_name]
         
         # Create sample professor and assign to a course
         prof_code = f"PROF_{secrets.token_hex(4).upper()}"
-        existing_prof = crud.get_professor_by_code(db, prof_code)
-        
-        if not existing_prof:
-            professor = crud.create_professor(db, "Dr. Sample Professor", prof_code, course_id=course1.id)
+        if crud.bulk_create_missing(db, models.Professor, [
+            {"name": "Dr. Sample Professor", "code": prof_code, "course_id": course1_id}
+        ], ["code"]):
             print(f"✅ Created professor: Dr. Sample Professor")
             print(f"   Professor Code: {prof_code}")
-            print(f"   Assigned to: {course1.name}")
+            print(f"   Assigned to: {course1_name}")
             print(f"   ⚠️  SAVE THIS CODE - you'll need it to log in!")
         else:
             print(f"ℹ️  Professor code {prof_code} already exists")
         
-        # Create sample verified student
+        # Create sample verified student (students have no unique key to
+        # upsert on, so this one keeps its existence check)
         student = crud.get_student_by_university_id(db, "U123456")
         if not student:
             student = crud.create_student(
                 db,
                 university_id="U123456",
                 db_university_id=university.id,
-                db_major_id=cs_major.id,
+                db_major_id=cs_major_id,
                 year="1",
                 name="Test Student",
                 verified=True